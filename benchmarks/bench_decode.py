@@ -0,0 +1,81 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Compare the json backends on a synthetic bills tree, decoding whole documents
+and decoding only DOCUMENT_FIELDS. Rates are documents per second for the
+decode alone and for the decode followed by extract_bill.
+
+    python -m benchmarks.bench_decode --bills 5000
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+
+from govtrack2csv import DOCUMENT_FIELDS
+from govtrack2csv import extract_bill
+from govtrack2csv import list_documents
+from govtrack2csv import logger
+from govtrack2csv import decode
+
+from benchmarks.synthetic import make_bills
+
+
+def run(contents, load, extract):
+    start = time.perf_counter()
+    for content in contents:
+        doc = load(content)
+        if extract:
+            extract_bill(doc)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark json decoding backends")
+    parser.add_argument("--bills", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as root:
+        make_bills(root, 114, args.bills)
+        documents = list_documents({'congress': '114',
+                                    'src': "{0}/congress".format(root)})
+        contents = []
+        for kind, file_path in documents:
+            with open(file_path, 'rb') as f:
+                contents.append(f.read())
+
+    size = sum(len(c) for c in contents)
+    print("{0} bills, {1:.1f} MB".format(len(contents), size / 1e6))
+    print("{0:<10} {1:>12} {2:>12} {3:>12} {4:>12}".format(
+        'backend', 'full', 'fields', 'full+ext', 'fields+ext'))
+
+    fields = DOCUMENT_FIELDS['bills']
+    for name in decode.available_backends():
+        decode.set_backend(name)
+        rates = []
+        for extract in (False, True):
+            for load in (decode.loads,
+                         lambda c: decode.load_fields(c, fields)):
+                best = min(run(contents, load, extract)
+                           for _ in range(args.repeat))
+                rates.append(len(contents) / best)
+        print("{0:<10} {1:>12.0f} {2:>12.0f} {3:>12.0f} {4:>12.0f}".format(
+            name, *rates))
@@ -0,0 +1,233 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Time every stage of the pipeline, and the full convert_congress and
+extract_votes flows, on a synthetic tree. Results are saved as
+benchmarks/results/<commit>.json so two commits can be compared.
+
+    python -m benchmarks.bench_pipeline --bills 2000 --votes 400
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/abc1234.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from govtrack2csv import CONGRESS_DIR
+from govtrack2csv import build_congress
+from govtrack2csv import convert_congress
+from govtrack2csv import import_legislators
+from govtrack2csv import lis_map_from_legislators
+from govtrack2csv import logger
+from govtrack2csv import make_congress_dir
+from govtrack2csv import move_committees
+from govtrack2csv import process_amendments
+from govtrack2csv import process_bills
+from govtrack2csv import process_votes
+from govtrack2csv import save_congress
+from govtrack2csv import save_legislators
+from govtrack2csv import share_lis_map
+
+from benchmarks.synthetic import make_tree
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = "{0}/benchmarks/results".format(REPO)
+
+
+def git(*args):
+    try:
+        return subprocess.check_output(('git',) + args, cwd=REPO,
+                                       stderr=subprocess.DEVNULL
+                                       ).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def best_of(repeat, fn, *args):
+    """
+    Run fn repeat times and return the fastest time and the last result.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_script(name, *args):
+    """
+    Run one of the bin/ scripts against this checkout and return its wall
+    time.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REPO] + [p for p in [env.get('PYTHONPATH')] if p])
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, "{0}/bin/{1}".format(REPO, name)] +
+                          list(args) + ['--log-level', 'WARNING'], env=env)
+    return time.perf_counter() - start
+
+
+def bench_stages(src, dest, congresses, repeat):
+    """
+    Time each stage of the in memory conversion on its own, summed over the
+    congresses.
+    """
+    timings = {}
+    os.makedirs(dest)
+
+    def add(name, seconds):
+        timings[name] = timings.get(name, 0.0) + seconds
+
+    seconds, legislators = best_of(repeat, import_legislators, src)
+    add('import_legislators', seconds)
+    add('save_legislators',
+        best_of(repeat, save_legislators, legislators, dest)[0])
+    add('move_committees', best_of(repeat, move_committees, src, dest)[0])
+
+    lis_to_bio = lis_map_from_legislators(legislators)
+    share_lis_map(lis_to_bio)
+
+    for name in congresses:
+        congress = {'congress': name, 'dest': dest,
+                    'src': "{0}/{1}".format(src, CONGRESS_DIR)}
+        make_congress_dir(name, dest)
+
+        seconds, bills = best_of(repeat, process_bills, congress)
+        add('process_bills', seconds)
+        seconds, amendments = best_of(repeat, process_amendments, congress)
+        add('process_amendments', seconds)
+        seconds, votes = best_of(repeat, process_votes, congress)
+        add('process_votes', seconds)
+        seconds, congress_obj = best_of(repeat, build_congress, congress,
+                                        bills, amendments, votes, lis_to_bio)
+        add('build_congress', seconds)
+        add('save_congress',
+            best_of(repeat, save_congress, congress_obj, dest)[0])
+        add('convert_congress', best_of(repeat, convert_congress,
+                                        congress)[0])
+
+    return timings
+
+
+def bench_flows(src, dest, threads):
+    """
+    Time the command line scripts end to end.
+    """
+    os.makedirs(dest)
+    return {
+        'bin/convert_congress': run_script('convert_congress', src, dest,
+                                           '--threads', str(threads)),
+        'bin/extract_votes': run_script('extract_votes', dest, dest),
+    }
+
+
+def count_files(root):
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+def compare(current, previous):
+    print("{0:<24} {1:>10} {2:>10} {3:>8}".format(
+        'stage', previous.get('commit') or '?', current.get('commit') or '?',
+        'change'))
+    for name, seconds in sorted(current['timings'].items()):
+        before = previous['timings'].get(name)
+        if before:
+            print("{0:<24} {1:>10.3f} {2:>10.3f} {3:>+7.1f}%".format(
+                name, before, seconds, 100.0 * (seconds - before) / before))
+        else:
+            print("{0:<24} {1:>10} {2:>10.3f}".format(name, '-', seconds))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark the conversion pipeline on a synthetic tree")
+    parser.add_argument("--congresses", type=int, default=2,
+                        help="number of congresses, counting back from 114")
+    parser.add_argument("--bills", type=int, default=1000)
+    parser.add_argument("--actions", type=int, default=8)
+    parser.add_argument("--cosponsors", type=int, default=6)
+    parser.add_argument("--votes", type=int, default=200)
+    parser.add_argument("--amendments", type=int, default=200)
+    parser.add_argument("--members", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=3)
+    parser.add_argument("--tree", default=None,
+                        help="generate the tree here and keep it, reusing "
+                             "it if it already exists")
+    parser.add_argument("--results", default=RESULTS_DIR,
+                        help="directory the results json is written to")
+    parser.add_argument("--compare", default=None,
+                        help="results json of another commit to compare to")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    work = tempfile.mkdtemp(prefix='govtrack2csv-bench-')
+    try:
+        src = args.tree or "{0}/src".format(work)
+        congresses = [str(114 - i) for i in range(args.congresses)]
+        params = dict((k, getattr(args, k)) for k in (
+            'congresses', 'bills', 'actions', 'cosponsors', 'votes',
+            'amendments', 'members'))
+
+        if not os.path.exists("{0}/{1}".format(src, CONGRESS_DIR)):
+            start = time.perf_counter()
+            make_tree(src, [int(c) for c in congresses], args.bills,
+                      args.actions, args.cosponsors, args.votes,
+                      args.amendments, args.members)
+            print("Generated {0} files in {1:.1f}s".format(
+                count_files(src), time.perf_counter() - start))
+
+        timings = bench_stages(src, "{0}/stages".format(work), congresses,
+                               args.repeat)
+        timings.update(bench_flows(src, "{0}/flow".format(work),
+                                   args.threads))
+    finally:
+        shutil.rmtree(work)
+
+    commit = git('rev-parse', '--short', 'HEAD')
+    result = {'commit': commit,
+              'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+              'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(),
+              'pandas': pd.__version__,
+              'params': params,
+              'timings': timings}
+
+    os.makedirs(args.results, exist_ok=True)
+    out = "{0}/{1}.json".format(args.results, commit or 'unknown')
+    with open(out, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+    for name, seconds in sorted(timings.items()):
+        print("{0:<24} {1:>10.3f}s".format(name, seconds))
+    print("Saved {0}".format(out))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
@@ -0,0 +1,114 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+votes_people rows per second, building the table the way process_votes
+used to, a list per tally with the lis_id looked up tally by tally, against
+building it column wise (TallyColumns), starting from already decoded roll
+calls and ending with the lis_id remap.
+
+    python -m benchmarks.bench_tallies --votes 2000
+"""
+
+import argparse
+import logging
+import random
+import time
+
+import pandas as pd
+
+from govtrack2csv import logger
+from govtrack2csv import remap_lis_ids
+from govtrack2csv.schema import COLUMNS as TABLE_COLUMNS
+from govtrack2csv.tally import TallyColumns
+
+from benchmarks.synthetic import make_members
+from benchmarks.synthetic import make_vote
+
+COLUMNS = TABLE_COLUMNS['votes_people']
+
+
+TALLY_MAP = {
+    'Yea': 'y',
+    'Aye': 'y',
+    'Nay': 'n',
+    'No': 'n',
+    'Not Voting': 'nv',
+    'Present': 'p'
+}
+
+
+def by_rows(votes, lis_to_bio):
+    # The loop process_votes had before TallyColumns, without rewriting the
+    # tallies in place so every repeat does the same work.
+    rows = []
+    for v in votes:
+        for k, tallies in v['votes'].items():
+            for tally in tallies:
+                try:
+                    logger.debug('got to append')
+                    if not isinstance(tally, str):
+                        bioguide_id = tally['id']
+                        if bioguide_id in lis_to_bio:
+                            logger.debug(
+                                "Replacing Tally ID {0} with {1}".format(
+                                    bioguide_id, lis_to_bio[bioguide_id]))
+                            bioguide_id = lis_to_bio[bioguide_id]
+                        rows.append([TALLY_MAP[k], v['vote_id'], bioguide_id,
+                                     tally['party'], tally['state'],
+                                     v['date']])
+                except KeyError as ke:
+                    logger.error("bad vote key: {0}".format(ke))
+    frame = pd.DataFrame(rows)
+    frame.columns = COLUMNS
+    return frame
+
+
+def by_columns(votes, lis_to_bio):
+    tallies = TallyColumns()
+    for v in votes:
+        tallies.add_vote(v)
+    frame = tallies.to_frame()
+    frame['bioguide_id'] = remap_lis_ids(frame['bioguide_id'], lis_to_bio)
+    return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark votes_people construction")
+    parser.add_argument("--votes", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=535)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    rnd = random.Random(0)
+    members = make_members(args.members)
+    votes = [make_vote(rnd, 114, 'h' if i % 2 else 's', i + 1, members)
+             for i in range(args.votes)]
+    lis_to_bio = dict((m['lis_id'], m['bioguide_id']) for m in members
+                      if m['lis_id'])
+
+    for name, build in (('rows', by_rows), ('columns', by_columns)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            frame = build(votes, lis_to_bio)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print("{0:<8} {1:>10} rows {2:>12.0f} rows/s {3:>8.1f} MB".format(
+            name, len(frame), len(frame) / best,
+            frame.memory_usage(deep=True).sum() / 1e6))
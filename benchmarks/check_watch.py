@@ -0,0 +1,87 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Check that convert_congress --watch stops on a ^C. A terminal sends SIGINT
+to the whole process group, the workers included, so the daemon is started
+in a group of its own and the group is signalled once it is watching.
+
+    python -m benchmarks.check_watch
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import make_tree
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def check_watch(src, dest, sig, timeout):
+    """
+    Returns the exit status of a watching convert_congress sent sig, or
+    None if it was still running timeout seconds later.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REPO] + [p for p in [env.get('PYTHONPATH')] if p])
+    daemon = subprocess.Popen(
+        [sys.executable, "{0}/bin/convert_congress".format(REPO), src, dest,
+         '--threads', '2', '--watch', '--watch-backend', 'poll'],
+        env=env, stderr=subprocess.PIPE, universal_newlines=True,
+        start_new_session=True)
+    try:
+        for line in daemon.stderr:
+            if 'Watching' in line:
+                break
+        os.killpg(daemon.pid, sig)
+        try:
+            daemon.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return None
+        return daemon.returncode
+    finally:
+        if daemon.poll() is None:
+            os.killpg(daemon.pid, signal.SIGKILL)
+            daemon.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Check convert_congress --watch stops on a signal to "
+                    "its process group")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    failed = False
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dest = os.path.join(root, 'dest')
+            make_tree(src, bills=50, votes=20, amendments=20, members=50)
+            os.makedirs(dest)
+            status = check_watch(src, dest, sig, args.timeout)
+        if status is None:
+            print("{0}: still running after {1}s".format(sig.name,
+                                                         args.timeout))
+            failed = True
+        else:
+            print("{0}: exited with {1}".format(sig.name, status))
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,337 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Generate a synthetic govtrack congress tree shaped like the real one, so we
+can benchmark without downloading anything.
+"""
+
+import csv
+import json
+import os
+import random
+
+import yaml
+
+
+__author__ = 'vance@hackthefed.org'
+
+BILL_TYPES = ['hr', 'hres', 'hjres', 'hconres', 's', 'sres', 'sjres',
+              'sconres']
+STATES = ['AL', 'AK', 'AZ', 'CA', 'CO', 'FL', 'GA', 'IL', 'MA', 'NY', 'OH',
+          'PA', 'TX', 'VA', 'WA']
+SUBJECTS = ['Taxation', 'Health', 'Armed forces and national security',
+            'Government operations and politics', 'Education', 'Energy',
+            'Environmental protection', 'Immigration', 'Crime and law '
+            'enforcement', 'Agriculture and food']
+COMMITTEES = [('HSAG', 'House Agriculture'), ('HSAP', 'House Appropriations'),
+              ('SSFI', 'Senate Finance'), ('SSJU', 'Senate Judiciary')]
+
+WORDS = ('act amend authorize appropriations federal program state grant '
+         'secretary fiscal year provide establish require national service '
+         'public health energy tax credit').split()
+
+
+def text(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words))
+
+
+def make_bill(rnd, congress, bill_type, number, actions=8, cosponsors=6):
+    """
+    Returns a bill data.json dict with the fields we extract plus the bulky
+    ones (summary, titles, history...) that real bills carry.
+    """
+    bill_id = "{0}{1}-{2}".format(bill_type, number, congress)
+    day = "{0}-{1:02d}-{2:02d}".format(1787 + 2 * congress,
+                                       rnd.randint(1, 12), rnd.randint(1, 28))
+    committee_id, committee = rnd.choice(COMMITTEES)
+    return {
+        'bill_id': bill_id,
+        'bill_type': bill_type,
+        'congress': str(congress),
+        'number': str(number),
+        'introduced_at': day,
+        'updated_at': "{0}T12:00:00-05:00".format(day),
+        'status': rnd.choice(['REFERRED', 'PASSED:BILL', 'ENACTED:SIGNED']),
+        'status_at': day,
+        'official_title': text(rnd, 30),
+        'popular_title': None,
+        'short_title': text(rnd, 6),
+        'top_subject': rnd.choice(SUBJECTS),
+        'subjects': rnd.sample(SUBJECTS, rnd.randint(0, 5)),
+        'sponsor': {'type': 'person', 'thomas_id': "{0:05d}".format(
+            rnd.randint(1, 2000)), 'name': text(rnd, 2),
+            'district': str(rnd.randint(1, 20)), 'state': rnd.choice(STATES),
+            'title': 'Rep'},
+        'cosponsors': [{'thomas_id': "{0:05d}".format(rnd.randint(1, 2000)),
+                        'name': text(rnd, 2), 'district': None,
+                        'state': rnd.choice(STATES),
+                        'sponsored_at': day, 'withdrawn_at': None}
+                       for _ in range(rnd.randint(0, 2 * cosponsors))],
+        'committees': [{'activity': ['referral'], 'committee': committee,
+                        'committee_id': committee_id}] +
+                      ([{'activity': ['referral'], 'committee': committee,
+                         'committee_id': committee_id,
+                         'subcommittee': text(rnd, 3),
+                         'subcommittee_id': str(rnd.randint(1, 30))}]
+                       if rnd.random() < 0.3 else []),
+        'actions': [{'acted_at': day, 'text': text(rnd, 25),
+                     'type': rnd.choice(['action', 'referral', 'vote']),
+                     'committees': [committee_id],
+                     'references': []}
+                    for _ in range(rnd.randint(1, 2 * actions))],
+        'summary': {'as': 'Introduced in House', 'date': day,
+                    'text': text(rnd, 400)},
+        'titles': [{'as': 'introduced', 'is_for_portion': False,
+                    'title': text(rnd, 20), 'type': 'official'}
+                   for _ in range(4)],
+        'history': {'active': False, 'awaiting_signature': False,
+                    'enacted': False, 'vetoed': False},
+        'related_bills': [{'bill_id': "hr{0}-{1}".format(
+            rnd.randint(1, 5000), congress), 'reason': 'related',
+            'type': 'bill'} for _ in range(rnd.randint(0, 5))],
+        'amendments': [],
+        'committee_reports': [],
+        'enacted_as': None,
+        'by_request': False,
+        'url': "https://www.congress.gov/bill/{0}".format(bill_id),
+    }
+
+
+def write_json(path, doc):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(doc, f, indent=2)
+
+
+def make_bills(root, congress, bills, seed=0, **kwargs):
+    """
+    Write bills data.json files for one congress under
+    root/congress/<congress>/bills/<type>/<type><number>/, along with the
+    text-versions directories the converter has to skip.
+    """
+    rnd = random.Random(seed + congress)
+    for i in range(bills):
+        bill_type = rnd.choice(BILL_TYPES)
+        bill_dir = "{0}/congress/{1}/bills/{2}/{2}{3}".format(
+            root, congress, bill_type, i + 1)
+        write_json("{0}/data.json".format(bill_dir),
+                   make_bill(rnd, congress, bill_type, i + 1, **kwargs))
+        write_json("{0}/text-versions/ih/data.json".format(bill_dir),
+                   {'bill_version_id': "{0}{1}-{2}-ih".format(
+                       bill_type, i + 1, congress)})
+
+
+def make_members(count, seed=0):
+    """
+    Returns count fake members of congress as dicts with the ids, party and
+    state the vote tallies carry. Every fifth one is a senator with a lis_id.
+    """
+    rnd = random.Random(seed)
+    members = []
+    for i in range(count):
+        senator = i % 5 == 0
+        members.append({'bioguide_id': "B{0:06d}".format(i),
+                        'thomas_id': "{0:05d}".format(i + 1),
+                        'lis_id': "S{0:03d}".format(i) if senator else None,
+                        'type': 'sen' if senator else 'rep',
+                        'party': rnd.choice(['D', 'R', 'I']),
+                        'state': rnd.choice(STATES),
+                        'district': None if senator else rnd.randint(1, 20),
+                        'last_name': "Last{0}".format(i),
+                        'first_name': "First{0}".format(i),
+                        'gender': rnd.choice(['M', 'F']),
+                        'birthday': "19{0:02d}-01-01".format(rnd.randint(30,
+                                                                        80))})
+    return members
+
+
+def make_vote(rnd, congress, chamber, number, members, session='2015'):
+    """
+    Returns a roll call data.json dict. House tallies use bioguide ids and
+    senate tallies lis_ids like the real data, the senate also gets the
+    occasional vice president string tally.
+    """
+    day = "{0}-{1:02d}-{2:02d}".format(1787 + 2 * congress,
+                                       rnd.randint(1, 12), rnd.randint(1, 28))
+    yes, no = ('Yea', 'Nay') if chamber == 's' or rnd.random() < 0.7 else \
+        ('Aye', 'No')
+    tallies = {yes: [], no: [], 'Not Voting': [], 'Present': []}
+    for m in members:
+        if (m['type'] == 'sen') != (chamber == 's'):
+            continue
+        key = rnd.choice([yes, yes, no, no, 'Not Voting', 'Present'])
+        tallies[key].append({
+            'id': m['lis_id'] if chamber == 's' else m['bioguide_id'],
+            'display_name': m['last_name'], 'party': m['party'],
+            'state': m['state']})
+    if chamber == 's' and rnd.random() < 0.05:
+        tallies[yes].append('VP')
+    vote = {
+        'category': rnd.choice(['passage', 'amendment', 'cloture',
+                                'procedural', 'quorum']),
+        'chamber': chamber,
+        'congress': congress,
+        'date': "{0}T12:00:00-05:00".format(day),
+        'number': number,
+        'question': text(rnd, 12),
+        'requires': '1/2',
+        'result': rnd.choice(['Passed', 'Failed']),
+        'result_text': 'Passed',
+        'session': session,
+        'source_url': 'http://clerk.house.gov/',
+        'type': 'On Passage',
+        'updated_at': "{0}T18:00:00-05:00".format(day),
+        'vote_id': "{0}{1}-{2}.{3}".format(chamber, number, congress,
+                                           session),
+        'votes': tallies,
+    }
+    if rnd.random() < 0.6:
+        vote['bill'] = {'congress': congress, 'number': rnd.randint(1, 5000),
+                        'type': 'hr'}
+    return vote
+
+
+def make_votes(root, congress, votes, members, seed=0):
+    """
+    Write roll call data.json files for one congress under
+    root/congress/<congress>/votes/<session>/<chamber><number>/.
+    """
+    rnd = random.Random(seed + congress)
+    session = str(1787 + 2 * congress)
+    for i in range(votes):
+        chamber = 'h' if i % 2 else 's'
+        write_json("{0}/congress/{1}/votes/{2}/{3}{4}/data.json".format(
+            root, congress, session, chamber, i + 1),
+            make_vote(rnd, congress, chamber, i + 1, members, session))
+
+
+def make_amendment(rnd, congress, number):
+    """
+    Returns an amendment data.json dict.
+    """
+    day = "{0}-{1:02d}-{2:02d}".format(1787 + 2 * congress,
+                                       rnd.randint(1, 12), rnd.randint(1, 28))
+    chamber = rnd.choice(['h', 's'])
+    amendment_type = "{0}amdt".format(chamber)
+    return {
+        'amendment_id': "{0}{1}-{2}".format(amendment_type, number, congress),
+        'amendment_type': amendment_type,
+        'amends_amendment': None,
+        'amends_bill': {'bill_id': "hr{0}-{1}".format(rnd.randint(1, 5000),
+                                                      congress),
+                        'bill_type': 'hr', 'congress': congress,
+                        'number': rnd.randint(1, 5000)},
+        'amends_treaty': None,
+        'chamber': chamber,
+        'congress': congress,
+        'description': text(rnd, 20),
+        'introduced_at': day,
+        'number': number,
+        'proposed_at': "{0}T12:00:00-05:00".format(day),
+        'purpose': text(rnd, 10) if rnd.random() < 0.5 else None,
+        'sponsor': {'thomas_id': "{0:05d}".format(rnd.randint(1, 2000)),
+                    'type': 'person'} if rnd.random() < 0.9 else
+                   {'committee_id': rnd.choice(COMMITTEES)[0],
+                    'type': 'committee'},
+        'status': rnd.choice(['offered', 'pass', 'fail', 'withdrawn']),
+        'status_at': day,
+        'updated_at': "{0}T18:00:00-05:00".format(day),
+        'actions': [{'acted_at': day, 'text': text(rnd, 15),
+                     'type': 'action'} for _ in range(rnd.randint(1, 4))],
+    }
+
+
+def make_amendments(root, congress, amendments, seed=0):
+    """
+    Write amendment data.json files for one congress under
+    root/congress/<congress>/amendments/<type>/<type><number>/.
+    """
+    rnd = random.Random(seed + congress)
+    for i in range(amendments):
+        a = make_amendment(rnd, congress, i + 1)
+        write_json("{0}/congress/{1}/amendments/{2}/{2}{3}/data.json".format(
+            root, congress, a['amendment_type'], i + 1), a)
+
+
+# The columns of congress-legislators' legislators-*.csv
+LEGISLATOR_COLUMNS = [
+    'last_name', 'first_name', 'birthday', 'gender', 'type', 'state',
+    'district', 'party', 'url', 'address', 'phone', 'contact_form', 'rss_url',
+    'twitter', 'facebook', 'facebook_id', 'youtube', 'youtube_id',
+    'bioguide_id', 'thomas_id', 'opensecrets_id', 'lis_id', 'cspan_id',
+    'govtrack_id', 'votesmart_id', 'ballotpedia_id', 'washington_post_id',
+    'icpsr_id', 'wikipedia_id']
+
+
+def write_legislators(root, members):
+    """
+    Write members as congress-legislators' legislators-current.csv and
+    legislators-historic.csv, half in each.
+    """
+    legislator_dir = "{0}/congress-legislators".format(root)
+    os.makedirs(legislator_dir, exist_ok=True)
+    half = len(members) // 2
+    for filename, rows in (('legislators-current.csv', members[:half]),
+                           ('legislators-historic.csv', members[half:])):
+        with open("{0}/{1}".format(legislator_dir, filename), 'w',
+                  newline='') as f:
+            writer = csv.DictWriter(f, LEGISLATOR_COLUMNS,
+                                    extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def write_committees(root, members, seed=0):
+    """
+    Write congress-legislators' committee yaml files for COMMITTEES, each
+    with a few subcommittees and members.
+    """
+    rnd = random.Random(seed)
+    legislator_dir = "{0}/congress-legislators".format(root)
+    os.makedirs(legislator_dir, exist_ok=True)
+
+    committees = [{'type': 'house' if c[0] == 'H' else 'senate',
+                   'name': name, 'thomas_id': c, 'url': 'http://example.com/',
+                   'subcommittees': [{'name': text(rnd, 3),
+                                      'thomas_id': "{0:02d}".format(i)}
+                                     for i in range(1, 6)]}
+                  for c, name in COMMITTEES]
+    membership = dict((c, [{'name': m['last_name'], 'party': 'majority',
+                            'rank': i + 1, 'bioguide': m['bioguide_id']}
+                           for i, m in enumerate(rnd.sample(members, 10))])
+                      for c, name in COMMITTEES)
+
+    for filename, data in (('committees-current.yaml', committees),
+                           ('committees-historical.yaml', committees),
+                           ('committee-membership-current.yaml', membership)):
+        with open("{0}/{1}".format(legislator_dir, filename), 'w') as f:
+            yaml.safe_dump(data, f)
+
+
+def make_tree(root, congresses=(113, 114), bills=1000, actions=8,
+              cosponsors=6, votes=200, amendments=200, members=600, seed=0):
+    """
+    Write a full govtrack tree under root, congress/ and
+    congress-legislators/, the layout convert_congress expects as source.
+    """
+    people = make_members(members, seed)
+    write_legislators(root, people)
+    write_committees(root, people, seed)
+    for congress in congresses:
+        make_bills(root, congress, bills, seed, actions=actions,
+                   cosponsors=cosponsors)
+        make_amendments(root, congress, amendments, seed)
+        make_votes(root, congress, votes, people, seed)
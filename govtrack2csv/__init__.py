@@ -13,23 +13,37 @@
 # You should have received a copy of the GNU General Public License
 # along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
 
-import csv
-import json
 import logging
-import multiprocessing
 import os
 import os.path
 import pandas as pd
+import signal
 import sys
-import yaml  # Ruby users should die.
 
 from collections import defaultdict
 
-from govtrack2csv.util import datestring_to_datetime
-from govtrack2csv.model import Congress
+from govtrack2csv import stats
 
-logger = multiprocessing.log_to_stderr()
-logger.setLevel(logging.DEBUG)
+from govtrack2csv.model import Congress
+from govtrack2csv.decode import load_fields
+from govtrack2csv.logs import worker_logging
+from govtrack2csv.output import file_path, read_frame, replace_dir, write_frame
+from govtrack2csv.scan import KINDS, by_kind
+from govtrack2csv.schema import (TABLES, Legislation, Sponsor, Cosponsor,
+                                 Event, CommitteeRef, Subject, Vote,
+                                 Amendment, VoteTally, date_columns,
+                                 empty_row, normalize_frame, typed_frame)
+from govtrack2csv.manifest import Manifest, MANIFEST_FILE
+from govtrack2csv.matrix import has_rollcall_matrices, save_rollcall_matrices
+from govtrack2csv.sink import open_sink
+from govtrack2csv.source import (congress_source, open_file, order_entries,
+                                 read_file)
+from govtrack2csv.stream import TableWriter, BUFFER_ROWS
+from govtrack2csv.tally import TallyColumns
+from govtrack2csv.yamlcache import load_yaml
+
+# Logging is configured by the command line scripts, see govtrack2csv.logs.
+logger = logging.getLogger(__name__)
 
 LEGISLATOR_DIR = 'congress-legislators'
 CONGRESS_DIR = 'congress'
@@ -40,36 +54,57 @@ def import_legislators(src):
     Read the legislators from the csv files into a single Dataframe. Intended
     for importing new data.
     """
-    logger.info("Importing Legislators From: {0}".format(src))
-    current = pd.read_csv("{0}/{1}/legislators-current.csv".format(
-        src, LEGISLATOR_DIR))
-    historic = pd.read_csv("{0}/{1}/legislators-historic.csv".format(
-        src, LEGISLATOR_DIR))
-    legislators = current.append(historic)
+    logger.info("Importing Legislators From: %s", src)
+    current = pd.read_csv(open_file(
+        src, "{0}/legislators-current.csv".format(LEGISLATOR_DIR)))
+    historic = pd.read_csv(open_file(
+        src, "{0}/legislators-historic.csv".format(LEGISLATOR_DIR)))
+    legislators = pd.concat([current, historic])
 
     return legislators
 
 
-def save_legislators(legislators, destination):
+def save_table(frame, dest, name, fmt='csv', sink=None):
+    """
+    Save a table that is not split by congress to dest, or to sink if one
+    is given.
+    """
+    if sink:
+        open_sink(sink).write_frame(name, frame)
+    else:
+        write_frame(frame, "{0}/{1}".format(dest, name), fmt)
+
+
+def save_legislators(legislators, destination, fmt='csv', sink=None):
     """
     Output legislators datafrom to csv.
     """
-    logger.info("Saving Legislators To: {0}".format(destination))
-    legislators.to_csv("{0}/legislators.csv".format(destination),
-                       encoding='utf-8')
+    logger.info("Saving Legislators To: %s", sink or destination)
+    save_table(legislators, destination, 'legislators', fmt, sink)
 
 
-def move_legislators(src, dest):
+def move_legislators(src, dest, fmt='csv', sink=None):
     logger.info("Moving Legislators")
     legislators = import_legislators(src)
-    save_legislators(legislators, dest)
-    logger.info("Saved {0} Legislators".format(len(legislators)))
+    save_legislators(legislators, dest, fmt, sink)
+    logger.info("Saved %s Legislators", len(legislators))
+    return legislators
 
 #
 # Committee Functions
 #
 
 
+def load_committee_yaml(src, filename):
+    """
+    Parse one of the congress-legislators yaml files of a snapshot, a
+    directory or an archive.
+    """
+    name = "{0}/{1}".format(LEGISLATOR_DIR, filename)
+    return load_yaml("{0}/{1}".format(src, name),
+                     content=read_file(src, name))
+
+
 def import_committees(src):
     """
     Read the committees from the csv files into a single Dataframe. Intended for importing new data.
@@ -77,13 +112,9 @@ def import_committees(src):
     committees = []
     subcommittees = []
 
-    with open("{0}/{1}/committees-current.yaml".format(src, LEGISLATOR_DIR),
-              'r') as stream:
-        committees += yaml.load(stream)
-
-    with open("{0}/{1}/committees-historical.yaml".format(src, LEGISLATOR_DIR),
-              'r') as stream:
-        committees += yaml.load(stream)
+    # Ruby users should die.
+    committees += load_committee_yaml(src, 'committees-current.yaml')
+    committees += load_committee_yaml(src, 'committees-historical.yaml')
 
     # Sub Committees are not Committees
     # And unfortunately the good folk at thomas thought modeling data with duplicate id's was a good idea.
@@ -108,28 +139,27 @@ def import_committees(src):
     return [committees_df, subcommittees_df]
 
 
-def save_committees(committees, dest):
+def save_committees(committees, dest, fmt='csv', sink=None):
     """
     Output legislators datafrom to csv.
     """
-    committees.to_csv("{0}/committees.csv".format(dest), encoding='utf-8')
+    save_table(committees, dest, 'committees', fmt, sink)
 
 
-def save_subcommittees(subcommittees, dest):
+def save_subcommittees(subcommittees, dest, fmt='csv', sink=None):
     """
     Output legislators datafrom to csv.
     """
-    subcommittees.to_csv("{0}/subcommittees.csv".format(dest),
-                         encoding='utf-8')
+    save_table(subcommittees, dest, 'subcommittees', fmt, sink)
 
 
-def move_committees(src, dest):
+def move_committees(src, dest, fmt='csv', sink=None):
     """
     Import stupid yaml files, convert to something useful.
     """
     comm, sub_comm = import_committees(src)
-    save_committees(comm, dest)
-    save_subcommittees(comm, dest)
+    save_committees(comm, dest, fmt, sink)
+    save_subcommittees(comm, dest, fmt, sink)
 
 
 def make_congress_dir(congress, dest):
@@ -139,9 +169,9 @@ def make_congress_dir(congress, dest):
 
     congress_dir = "{0}/{1}".format(dest, congress)
     path = os.path.dirname(congress_dir)
-    logger.debug("CSV DIR: {}".format(path))
+    logger.debug("CSV DIR: %s", path)
     if not os.path.exists(congress_dir):
-        logger.info("Created: {0}".format(congress_dir))
+        logger.info("Created: %s", congress_dir)
         os.mkdir(congress_dir)
     return congress_dir
 
@@ -155,51 +185,48 @@ def load_subjects(congresses):
     return pd.concat(temp_array)
 
 
-def save_congress(congress, dest):
+def save_congress(congress, dest, fmt='csv', sink=None, matrix=False):
     """
     Takes a congress object with legislation, sponser, cosponsor, commities
-    and subjects attributes and saves each item to it's own csv file.
-    """
-    try:
-        logger.debug(congress.name)
-        logger.debug(dest)
-        congress_dir = make_congress_dir(congress.name, dest)
-        congress.legislation.to_csv("{0}/legislation.csv".format(congress_dir),
-                                    encoding='utf-8')
-        logger.debug(congress_dir)
-        congress.sponsors.to_csv("{0}/sponsor_map.csv".format(congress_dir),
-                                 encoding='utf-8')
-        congress.cosponsors.to_csv(
-            "{0}/cosponsor_map.csv".format(congress_dir),
-            encoding='utf-8')
-        congress.events.to_csv("{0}/events.csv".format(congress_dir),
-                               encoding='utf-8')
-        congress.committees.to_csv(
-            "{0}/committees_map.csv".format(congress_dir),
-            encoding='utf-8')
-        congress.subjects.to_csv("{0}/subjects_map.csv".format(congress_dir),
-                                 encoding='utf-8')
-        congress.votes.to_csv("{0}/votes.csv".format(congress_dir),
-                              encoding='utf-8')
-        congress.votes_people.to_csv(
-            "{0}/votes_people.csv".format(congress_dir),
-            encoding='utf-8')
-        if hasattr(congress, 'amendments'):
-            congress.amendments.to_csv(
-                "{0}/amendments.csv".format(congress_dir),
-                encoding='utf-8')
-    except Exception:
-        logger.error("############################################shoot me")
-        exc_type, exc_obj, exc_tb = sys.exc_info()
-        fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-        logger.error(exc_type, fname, exc_tb.tb_lineno)
+    and subjects attributes and saves each item to it's own csv file, or
+    parquet or arrow file depending on fmt. Given a sink the tables go there
+    instead. With matrix the roll call matrices of govtrack2csv.matrix are
+    saved along with the files.
+    """
+    if sink:
+        # Named after the csv files, committees is already taken by the
+        # committee list.
+        tables = dict((os.path.splitext(filename)[0], getattr(congress, table))
+                      for table, filename, columns in TABLES
+                      if hasattr(congress, table))
+        with stats.stage('write'):
+            open_sink(sink).write_congress(congress.name, tables)
+        stats.count('write', rows=sum(len(t) for t in tables.values()))
+        return
+
+    logger.debug(congress.name)
+    logger.debug(dest)
+    # Written next to the congress directory and swapped in once every table
+    # is there, a failed save leaves the last good output alone.
+    with replace_dir("{0}/{1}".format(dest, congress.name)) as congress_dir:
+        for table, filename, columns in TABLES:
+            # Amendment data is not avalible for all congresses
+            if hasattr(congress, table):
+                frame = getattr(congress, table)
+                with stats.stage('write'):
+                    write_frame(frame, "{0}/{1}".format(
+                        congress_dir, os.path.splitext(filename)[0]), fmt,
+                        table)
+                stats.count('write', files=1, rows=len(frame))
+        if matrix:
+            with stats.stage('write'):
+                save_rollcall_matrices(congress.votes, congress.votes_people,
+                                       congress_dir)
 
 
 def import_committee_membership(src):
-    with open(
-            "{0}/congress-legislators/committee-membership-current.yaml".format(
-                src), 'r') as stream:
-        c_membership = yaml.load(stream)
+    c_membership = load_committee_yaml(src,
+                                       'committee-membership-current.yaml')
 
     members = []
 
@@ -216,86 +243,69 @@ def import_committee_membership(src):
     return pd.DataFrame(members)
 
 
-def save_committee_membership(membership, dest):
+def save_committee_membership(membership, dest, sink=None):
+    if sink:
+        open_sink(sink).write_frame('membership', membership)
+        return
     membership.to_csv("{0}/csv/membership.csv".format(dest), encoding='utf-8')
 
 
 def extract_legislation(bill):
     """
-    Returns a list of the legislation fields we need for our legislation DataFrame
+    Returns the legislation row of a bill.
     :param bill:
-    :return list:
-    """
-    record = []
-    record.append(bill.get('congress', None))
-    record.append(bill.get('bill_id', None))
-    record.append(bill.get('bill_type', None))
-    record.append(bill.get('introduced_at', None))
-    record.append(bill.get('number', None))
-    record.append(bill.get('official_title', None))
-    record.append(bill.get('popular_title', None))
-    record.append(bill.get('short_title', None))
-    record.append(bill.get('status', None))
-    record.append(bill.get('status_at', None))
-    record.append(bill.get('top_subject', None))
-    record.append(bill.get('updated_at', None))
-
-    return record
+    :return Legislation:
+    """
+    return Legislation(
+        bill.get('congress', None),
+        bill.get('bill_id', None),
+        bill.get('bill_type', None),
+        bill.get('introduced_at', None),
+        bill.get('number', None),
+        bill.get('official_title', None),
+        bill.get('popular_title', None),
+        bill.get('short_title', None),
+        bill.get('status', None),
+        bill.get('status_at', None),
+        bill.get('top_subject', None),
+        bill.get('updated_at', None))
 
 
 def extract_sponsor(bill):
     """
-    Return a list of the fields we need to map a sponser to a bill
+    Return the row mapping a sponser to a bill, or None if it has none.
     """
-    logger.debug("Extracting Sponsor")
-    sponsor_map = []
     sponsor = bill.get('sponsor', None)
-    if sponsor:
-        sponsor_map.append(sponsor.get('type'))
-        sponsor_map.append(sponsor.get('thomas_id'))
-        sponsor_map.append(bill.get('bill_id'))
-        sponsor_map.append(sponsor.get('district'))
-        sponsor_map.append(sponsor.get('state'))
-    logger.debug("END Extracting Sponsor")
-    return sponsor_map if sponsor_map else None
+    if not sponsor:
+        return None
+    return Sponsor(sponsor.get('type'), sponsor.get('thomas_id'),
+                   bill.get('bill_id'), sponsor.get('district'),
+                   sponsor.get('state'))
 
 
 def extract_cosponsors(bill):
     """
-    Return a list of list relating cosponsors to legislation.
+    Return a list of rows relating cosponsors to legislation.
     """
-    logger.debug("Extracting Cosponsors")
-    cosponsor_map = []
     cosponsors = bill.get('cosponsors', [])
     bill_id = bill.get('bill_id', None)
 
-    for co in cosponsors:
-        co_list = []
-        co_list.append(co.get('thomas_id'))
-        co_list.append(bill_id)
-        co_list.append(co.get('district'))
-        co_list.append(co.get('state'))
-        cosponsor_map.append(co_list)
-
-    logger.debug("End Extractioning Cosponsors")
-
-    return cosponsor_map
+    return [Cosponsor(co.get('thomas_id'), bill_id, co.get('district'),
+                      co.get('state'))
+            for co in cosponsors]
 
 
 def extract_subjects(bill):
     """
     Return a list subject for legislation.
     """
-    logger.debug("Extracting Subjects")
     subject_map = []
     subjects = bill.get('subjects', [])
     bill_id = bill.get('bill_id', None)
     bill_type = bill.get('bill_type', None)
 
     for sub in subjects:
-        subject_map.append((bill_id, bill_type, sub))
-
-    logger.debug("End Extractioning Subjects")
+        subject_map.append(Subject(bill_id, bill_type, sub))
 
     return subject_map
 
@@ -305,29 +315,27 @@ def extract_committees(bill):
     Returns committee associations from a bill.
     """
     bill_id = bill.get('bill_id', None)
-    logger.debug("Extracting Committees for {0}".format(bill_id))
+    # This runs for every bill, only pay for debug logging when it is on.
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Extracting Committees for %s", bill_id)
 
     committees = bill.get('committees', None)
     committee_map = []
 
     for c in committees:
-        logger.debug("Processing committee {0}".format(c.get('committee_id')))
-        c_list = []
         sub = c.get('subcommittee_id')
         if sub:
-            logger.debug("is subcommittee")
-            c_list.append('subcommittee')  # type
-            c_list.append(c.get('subcommittee'))
             sub_id = "{0}-{1}".format(
                 c.get('committee_id'), c.get('subcommittee_id'))
-            logger.debug("Processing subcommittee {0}".format(sub_id))
-            c_list.append(sub_id)
+            if debug:
+                logger.debug("Processing subcommittee %s", sub_id)
+            committee_map.append(CommitteeRef(
+                'subcommittee', c.get('subcommittee'), sub_id, bill_id))
         else:
-            c_list.append('committee')
-            c_list.append(c.get('committee'))
-            c_list.append(c.get('committee_id'))
-        c_list.append(bill_id)
-        committee_map.append(c_list)
+            committee_map.append(CommitteeRef(
+                'committee', c.get('committee'), c.get('committee_id'),
+                bill_id))
     return committee_map
 
 
@@ -344,354 +352,641 @@ def extract_events(bill):
     bill_id = bill.get('bill_id', None)
     if bill_id:
         for event in bill.get('actions', []):
-            e = []
-            e.append(bill_id)
-            e.append(event.get('acted_at', None))
-            e.append(event.get('how', None))
-            e.append(event.get('result', None))
-            e.append(event.get('roll', None))
-            e.append(event.get('status', None))
-            e.append(event.get('suspension', False))
-            e.append(event.get('text', None))
-            e.append(event.get('type', None))
-            e.append(event.get('vote_type', None))
-            e.append(event.get('where', None))
-            e.append(event.get('calander', None))
-            e.append(event.get('number', None))
-            e.append(event.get('under', None))
-            e.append(event.get('committee', None))
-            e.append(event.get('committees', []))
-            events.append(e)
+            events.append(Event(
+                bill_id,
+                event.get('acted_at', None),
+                event.get('how', None),
+                event.get('result', None),
+                event.get('roll', None),
+                event.get('status', None),
+                event.get('suspension', False),
+                event.get('text', None),
+                event.get('type', None),
+                event.get('vote_type', None),
+                event.get('where', None),
+                event.get('calander', None),
+                event.get('number', None),
+                event.get('under', None),
+                event.get('committee', None),
+                event.get('committees', [])))
     #logger.debug(events)
 
     return events
 
 
-def process_bills(congress):
-    logger.debug("Processing bills")
-
+def extract_bill(bill):
+    """
+    Run each of the bill extractors over a single bill and return the rows
+    they produced keyed by the table they belong in.
+    """
     data = defaultdict(list)
 
-    bills = "{0}/{1}/bills".format(congress['src'], congress['congress'])
-    logger.info("Processing Bills for {0}".format(congress['congress']))
+    data['legislation'].append(extract_legislation(bill))
+
+    sponsor = extract_sponsor(bill)
+    if sponsor:
+        data['sponsors'].append(sponsor)
+
+    data['cosponsors'].extend(extract_cosponsors(bill))
+    data['subjects'].extend(extract_subjects(bill))
+    data['committees'].extend(extract_committees(bill))
+    data['events'].extend(extract_events(bill))
+
+    return data
+
+
+def extract_amendment(a):
+    """
+    Returns the row of an amendment for our amendments DataFrame.
+    """
+    amends_amendment = a['amends_amendment']
+    amends_bill = a['amends_bill']
+    amends_treaty = a['amends_treaty']
+
+    return Amendment(
+        a['amendment_id'],
+        a['amendment_type'],
+        amends_amendment.get('amendment_id', None) if amends_amendment
+        else None,
+        amends_bill.get('bill_id', None) if amends_bill else None,
+        amends_treaty.get('treaty_id', None) if amends_treaty else None,
+        a['chamber'],
+        a['congress'],
+        a['description'],
+        a['introduced_at'],
+        a['number'],
+        a.get('proposed_at', None),
+        a['purpose'],
+        a['sponsor'].get('thomas_id', None),
+        a['sponsor'].get('committee_id', None),
+        a['sponsor']['type'],
+        a['status'],
+        a['updated_at'])
+
+
+UP_DOWN_SET = {'bill', 'amendment', 'passage', 'cloture', 'procedural',
+               'passage-suspension', 'nomination'
+               'recommit'}
+
+STUPID_TALLY_MAP = {
+    'Yea': 'y',
+    'Aye': 'y',
+    'Nay': 'n',
+    'No': 'n',
+    'Not Voting': 'nv',
+    'Present': 'p'
+}
+
+
+def extract_vote_record(v):
+    """
+    Returns the vote record for a single roll call, or None if the roll call
+    is not an up or down vote.
+    """
+    if v['category'] not in UP_DOWN_SET:
+        return None
+
+    if v.get('bill', None):
+        bill_id = "{type}{number}-{congress}".format(**v['bill'])
+    else:
+        bill_id = None
+
+    yes_vote = 'Yea' if 'Yea' in v['votes'].keys() else 'Aye'
+    no_vote = 'Nay' if 'Nay' in v['votes'].keys() else 'No'
+
+    try:
+        counts = (len(v['votes'][yes_vote]), len(v['votes'][no_vote]),
+                  len(v['votes']['Not Voting']), len(v['votes']['Present']))
+
+    except KeyError as ke:
+        logger.error("bad vote key: %s", v['vote_id'])
+        logger.error(ke)
+        counts = (None, None, None, None)
+    except:
+        e = sys.exc_info()[0]
+        logger.error(yes_vote)
+        logger.error(no_vote)
+        logger.error(v['chamber'])
+        logger.error(v['votes'].keys())
+        logger.error(v['category'])
+        raise e
 
-    for root, dirs, files in os.walk(bills):
-        if "data.json" in files and "text-versions" not in root:
-            file_path = "{0}/data.json".format(root)
-            logger.debug("Processing {0}".format(file_path))
-            bill = json.loads(open(file_path, 'r').read())
+    return Vote(str(v.get('amendment', None)), bill_id, v['category'],
+                v['congress'], v['chamber'], v['date'], v['number'],
+                v['requires'], v['result'], v.get('result_text', None),
+                v['session'], v['type'], v['updated_at'], v['vote_id'],
+                *counts)
 
-            logger.debug("OPENED {}".format(file_path))
 
-            # let's start with just the legislative information
+def extract_tallies(v):
+    """
+    Returns a list of VoteTally rows, one per member tally of a roll call. Row by row counterpart of TallyColumns,
+    for the code paths that need plain rows.
+    """
+    vote_person = []
+
+    for k, tallies in v['votes'].items():
+        for tally in tallies:
             try:
-                record = extract_legislation(bill)
-                data['legislation'].append(record)
+                # VP vote shows as string ignore for the time being
 
-                sponsor = extract_sponsor(bill)
-                data['sponsors'].append(sponsor)
+                # Some senate votes are recorded using the lis_id,
+                # build_congress normalizes those to the bioguide_id.
+                if not isinstance(tally, str):
+                    vote_person.append(VoteTally(
+                        STUPID_TALLY_MAP[k], v['vote_id'], tally['id'],
+                        tally['party'], tally['state'], v['date']))
+            except KeyError as ke:
+                logger.error("bad vote key: %s", ke)
+                logger.exception(ke)
+            except Exception as e:
+                logger.error(e)
+                logger.error(v['category'])
+                logger.error(v['vote_id'])
+                logger.error("Tally %s", tally)
+                logger.error(type(tally))
+                logger.error(k)
+                logger.error(tally)
+                raise e
 
-                cosponsor = extract_cosponsors(bill)
-                data['cosponsors'].extend(cosponsor)
+    return vote_person
 
-                subject = extract_subjects(bill)
-                data['subjects'].extend(subject)
 
-                committee = extract_committees(bill)
-                data['committees'].extend(committee)
+def extract_vote(v):
+    """
+    Returns the vote record and the list of individual tallies for a single
+    roll call, or None if the roll call is not an up or down vote.
+    """
+    vote = extract_vote_record(v)
+    if vote is None:
+        return None
+    return vote, extract_tallies(v)
 
-                evt = extract_events(bill)
-                data['events'].extend(evt)
 
-            except Exception:
-                exc_type, exc_obj, exc_tb = sys.exc_info()
-                fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-                logger.error(exc_type, fname, exc_tb.tb_lineno)
+# The top level keys of each kind of data.json that the extract functions
+# read. Everything else (summaries, titles, related bills...) is skipped when
+# decoding.
+DOCUMENT_FIELDS = {
+    'bills': ('congress', 'bill_id', 'bill_type', 'introduced_at', 'number',
+              'official_title', 'popular_title', 'short_title', 'status',
+              'status_at', 'top_subject', 'updated_at', 'sponsor',
+              'cosponsors', 'subjects', 'committees', 'actions'),
+    'amendments': ('amendment_id', 'amendment_type', 'amends_amendment',
+                   'amends_bill', 'amends_treaty', 'chamber', 'congress',
+                   'description', 'introduced_at', 'number', 'proposed_at',
+                   'purpose', 'sponsor', 'status', 'updated_at'),
+    'votes': ('amendment', 'bill', 'category', 'congress', 'chamber', 'date',
+              'number', 'requires', 'result', 'result_text', 'session',
+              'type', 'updated_at', 'vote_id', 'votes'),
+}
+
+
+def read_document(file_path, source=None):
+    """
+    Read a data.json from source, see govtrack2csv.source, or from disk.
+    """
+    with stats.stage('read'):
+        if source is not None:
+            return source.read(file_path)
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+
+def decode_document(kind, content):
+    """
+    Decode a data.json keeping only the fields we extract.
+    """
+    with stats.stage('decode'):
+        doc = load_fields(content, DOCUMENT_FIELDS[kind])
+    stats.count('decode', files=1)
+    return doc
+
+
+def load_document(kind, file_path, source=None):
+    """
+    Read and decode a data.json keeping only the fields we extract.
+    """
+    return decode_document(kind, read_document(file_path, source))
+
+
+def congress_entries(congress, kinds=KINDS):
+    """
+    The ScanEntry of every data.json of the given kinds in a congress, from
+    the 'entries' cost.estimate_costs left in the congress dict, or else
+    from scanning its source.
+    """
+    if congress.get('entries') is not None:
+        return order_entries(congress['entries'], kinds)
+    with stats.stage('walk'):
+        return congress_source(congress).scan(congress['congress'], kinds)
+
+
+def congress_paths(congress, kinds):
+    """
+    Scan a congress's source directory once for the data.json files of the
+    given kinds, returns a dict of kind to paths.
+    """
+    return by_kind(congress_entries(congress, kinds))
+
+
+def process_bills(congress, paths=None):
+    """
+    Extract the bills of a congress, the data.json files in paths or the
+    ones found by scanning its bills directory.
+    """
+    logger.debug("Processing bills")
+
+    data = defaultdict(list)
+    source = congress_source(congress)
+
+    if paths is None:
+        paths = congress_paths(congress, ['bills'])['bills']
+    logger.info("Processing Bills for %s", congress['congress'])
+
+    for path in paths:
+        logger.debug("Processing %s", path)
+        bill = load_document('bills', path, source)
+
+        logger.debug("OPENED %s", path)
+
+        # let's start with just the legislative information
+        try:
+            with stats.stage('extract'):
+                for table, rows in extract_bill(bill).items():
+                    data[table].extend(rows)
+
+        except Exception:
+            exc_type, exc_obj, exc_tb = sys.exc_info()
+            fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+            logger.error("%s in %s line %s", exc_type, fname,
+                         exc_tb.tb_lineno)
 
     return data
 
 
-def process_amendments(congress):
+def process_amendments(congress, paths=None):
     """
     Traverse amendments for a project
     """
-    amend_dir = "{0}/{1}/amendments".format(congress['src'],
-                                            congress['congress'])
-    logger.info("Processing Amendments for {0}".format(congress['congress']))
+    if paths is None:
+        paths = congress_paths(congress, ['amendments'])['amendments']
+    logger.info("Processing Amendments for %s", congress['congress'])
 
     amendments = []
+    source = congress_source(congress)
+
+    for path in paths:
+        logger.debug("Processing %s", path)
+        a = load_document('amendments', path, source)
+        with stats.stage('extract'):
+            amendments.append(extract_amendment(a))
 
-    for root, dirs, files in os.walk(amend_dir):
-        if "data.json" in files and "text-versions" not in root:
-            file_path = "{0}/data.json".format(root)
-            logger.debug("Processing {0}".format(file_path))
-            a = json.loads(open(file_path, 'r').read())
-            amendment = []
-
-            amendment.append(a['amendment_id'])
-            amendment.append(a['amendment_type'])
-            if a['amends_amendment']:
-                amendment.append(a['amends_amendment'].get('amendment_id',
-                                                           None))
-            else:
-                amendment.append(None)
-            if a['amends_bill']:
-                amendment.append(a['amends_bill'].get('bill_id', None))
-            else:
-                amendment.append(None)
-            if a['amends_treaty']:
-                amendment.append(a['amends_treaty'].get('treaty_id', None))
-            else:
-                amendment.append(None)
-            amendment.append(a['chamber'])
-            amendment.append(a['congress'])
-            amendment.append(a['description'])
-            amendment.append(a['introduced_at'])
-            amendment.append(a['number'])
-            amendment.append(a.get('proposed_at', None))
-            amendment.append(a['purpose'])
-            amendment.append(a['sponsor'].get('thomas_id', None))
-            amendment.append(a['sponsor'].get('committee_id', None))
-            amendment.append(a['sponsor']['type'])
-            amendment.append(a['status'])
-            amendment.append(a['updated_at'])
-
-            amendments.append(amendment)
-
-    return amendments if amendments else [[None] * 17]
-
-
-def process_votes(congress, lis_to_bio):
-    vote_dir = "{0}/{1}/votes".format(congress['src'], congress['congress'])
-    logger.info("Processing Votes for {0}".format(congress['congress']))
+    return amendments if amendments else [empty_row('amendments')]
+
+
+def process_votes(congress, paths=None):
+    """
+    Returns the vote records of a congress and its member tallies, the
+    tallies collected column wise in a TallyColumns.
+    """
+    if paths is None:
+        paths = congress_paths(congress, ['votes'])['votes']
+    logger.info("Processing Votes for %s", congress['congress'])
 
     votes = {}
     vote_data = []
-    vote_person = []
-    up_down_set = {'bill', 'amendment', 'passage', 'cloture', 'procedural',
-                   'passage-suspension', 'nomination'
-                   'recommit'}
-
-    for root, dirs, files in os.walk(vote_dir):
-        if "data.json" in files:
-            file_path = "{0}/data.json".format(root)
-            v = json.loads(open(file_path, 'r').read())
-            vote = []
-
-            if v['category'] in up_down_set:
-                if v.get('bill', None):
-                    bill_id = "{type}{number}-{congress}".format(**v['bill'])
-                else:
-                    bill_id = None
-
-                yes_vote = 'Yea' if 'Yea' in v['votes'].keys() else 'Aye'
-                no_vote = 'Nay' if 'Nay' in v['votes'].keys() else 'No'
-
-                stupid_tally_map = {
-                    'Yea': 'y',
-                    'Aye': 'y',
-                    'Nay': 'n',
-                    'No': 'n',
-                    'Not Voting': 'nv',
-                    'Present': 'p'
-                }
-
-                vote.append(str(v.get('amendment', None)))
-                vote.append(bill_id)
-                vote.append(v['category'])
-                vote.append(v['congress'])
-                vote.append(v['chamber'])
-                vote.append(v['date'])
-                vote.append(v['number'])
-                vote.append(v['requires'])
-                vote.append(v['result'])
-                vote.append(v.get('result_text', None))
-                vote.append(v['session'])
-                vote.append(v['type'])
-                vote.append(v['updated_at'])
-                vote.append(v['vote_id'])
-
-                try:
-                    if v['category'] in up_down_set:
-                        vote.append(len(v['votes'][yes_vote]))
-                        vote.append(len(v['votes'][no_vote]))
-                        vote.append(len(v['votes']['Not Voting']))
-                        vote.append(len(v['votes']['Present']))
-                    else:
-                        vote.append(0)
-                        vote.append(0)
-                        vote.append(0)
-                        vote.append(0)
-
-                except KeyError as ke:
-                    logger.error("bad vote key: {0}".format(v['vote_id']))
-                    logger.errro(ke)
-                except:
-                    e = sys.exc_info()[0]
-                    logger.error(yes_vote)
-                    logger.error(no_vote)
-                    logger.error(v['chamber'])
-                    logger.error(v['votes'].keys())
-                    logger.error(v['category'])
-                    raise e
-
+    vote_person = TallyColumns()
+    source = congress_source(congress)
+
+    for path in paths:
+        v = load_document('votes', path, source)
+        with stats.stage('extract'):
+            vote = extract_vote_record(v)
+            if vote:
                 vote_data.append(vote)
-                for k, tallies in v['votes'].items():
-                    for tally in tallies:
-                        try:
-                            logger.debug('got to append')
-                            # VP vote shows as string ignore for the time being
-
-                            if not isinstance(tally, str):
-                                # looks like some senate votes are recorded using the lis_id
-                                # normalize to the bioguide_id
-                                if tally['id'] in lis_to_bio:
-                                    logger.debug(
-                                        "Replacing Tally ID {0} with {1}".format(
-                                            tally['id'], lis_to_bio[tally[
-                                                'id']]))
-                                    tally['id'] = lis_to_bio[tally['id']]
-
-                                #if any(legislators.lis_id == tally['id']):
-                                #    tally['id'] = legislators[legislators.lis_id == tally['id']]['bioguide_id'].iloc[0]
-                                vote_person.append([stupid_tally_map[k], v[
-                                    'vote_id'], tally['id'], tally['party'],
-                                                    tally['state'], v['date']])
-                        except KeyError as ke:
-                            logger.error("bad vote key: {0}".format(ke))
-                            logger.error(tally['id'])
-                            logger.exception(ke)
-                        except Exception as e:
-                            logger.error(e)
-                            logger.error(v['category'])
-                            logger.error(v['vote_id'])
-                            logger.error("Tally {0}".format(tally))
-                            logger.error(type(tally))
-                            logger.error(k)
-                            logger.error(tally)
-                            raise e
-
-    votes['votes'] = vote_data if vote_data else [[None] * 18]
-    votes['people'] = vote_person if vote_person else [[None] * 6]
+                vote_person.add_vote(v)
+
+    votes['votes'] = vote_data if vote_data else [empty_row('votes')]
+    votes['people'] = vote_person if vote_person else \
+        [empty_row('votes_people')]
 
     return votes
 
 
-def lis_to_bio_map(folder):
+def list_documents(congress):
+    """
+    Scan the bills, amendments and votes of a congress the same way the
+    process_* functions do and return (kind, file_path) for every data.json.
+    """
+    return [(entry.kind, entry.path) for entry in congress_entries(congress)]
+
+
+def process_document(kind, content, tallies=None):
+    """
+    Decode a single data.json and return the rows extracted from it keyed by
+    table. Errors are handled the same way process_bills, process_amendments
+    and process_votes handle them. If a TallyColumns is passed as tallies,
+    vote tallies are added to it instead of returned as votes_people rows.
+    """
+    doc = decode_document(kind, content)
+    data = defaultdict(list)
+
+    with stats.stage('extract'):
+        if kind == 'bills':
+            try:
+                data.update(extract_bill(doc))
+            except Exception:
+                exc_type, exc_obj, exc_tb = sys.exc_info()
+                fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+                logger.error("%s in %s line %s", exc_type, fname,
+                             exc_tb.tb_lineno)
+        elif kind == 'amendments':
+            data['amendments'].append(extract_amendment(doc))
+        elif kind == 'votes':
+            vote = extract_vote_record(doc)
+            if vote:
+                data['votes'].append(vote)
+                if tallies is not None:
+                    tallies.add_vote(doc)
+                else:
+                    data['votes_people'].extend(extract_tallies(doc))
+
+    return data
+
+
+def lis_map_from_legislators(legislators):
     """
     Senators have a lis_id that is used in some places. That's dumb. Build a
     dict from lis_id to bioguide_id which every member of congress has.
     """
-    logger.info("Opening legislator csv for lis_dct creation")
-    lis_dic = {}
-    leg_path = "{0}/legislators.csv".format(folder)
-    logger.info(leg_path)
-    with open(leg_path, 'r') as csvfile:
-        leg_reader = csv.reader(csvfile)
-        for row in leg_reader:
-            if row[22]:
-                lis_dic[row[22]] = row[19]
-    return lis_dic
+    with_lis = legislators[legislators['lis_id'].notnull()]
+    return dict(zip(with_lis['lis_id'], with_lis['bioguide_id']))
 
 
-def convert_congress(congress):
+def lis_to_bio_map(folder, fmt='csv'):
     """
-    Recurse the passed govtrack congress directory and convert it's contents
-    to a set of csv files from the legislation contained therein.
-    :return dict: A Dictionary of DataFrames
+    Build the lis_id to bioguide_id dict from the legislators file we saved
+    to folder.
+    """
+    logger.info("Opening legislators for lis_dct creation")
+    return lis_map_from_legislators(
+        read_frame("{0}/legislators".format(folder), fmt))
+
+
+# The lis_id map is the same for every congress. bin/convert_congress builds
+# it once and hands it to each pool worker through share_lis_map.
+_lis_to_bio = None
+
+
+def share_lis_map(lis_to_bio):
+    """
+    Set the lis_id map used by this process. Works as a Pool initializer.
+    """
+    global _lis_to_bio
+    _lis_to_bio = lis_to_bio
+
+
+def init_worker(lis_to_bio, log_queue=None, log_level=logging.INFO):
+    """
+    Pool initializer for bin/convert_congress. Shares the lis_id map and,
+    given a queue, sends the worker's log records to the parent through it.
+    """
+    # A ^C, or a kill of the process group, must only reach the parent. A
+    # worker killed while waiting for a task leaves the task queue's lock
+    # held and the pool can never shut down, the parent stops the workers
+    # itself. Workers forked after the parent started handling TERM itself
+    # must still die on it, Pool.terminate relies on that.
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if log_queue is not None:
+        worker_logging(log_queue, log_level)
+    share_lis_map(lis_to_bio)
+
+
+def congress_lis_map(congress):
+    """
+    Returns the shared lis_id map, or reads it from the congress's
+    destination if nobody shared one.
     """
+    if _lis_to_bio is not None:
+        return _lis_to_bio
+    return lis_to_bio_map(congress['dest'], congress.get('format', 'csv'))
 
-    logger.info("Begin processing Congress {0}".format(congress['congress']))
 
+def remap_lis_ids(bioguide_ids, lis_to_bio):
+    """
+    Replace the lis_ids in a Series of member ids with bioguide_ids in one
+    vectorized pass, leaving every other id alone.
+    """
+    mapped = bioguide_ids.map(lis_to_bio)
+    return mapped.where(mapped.notnull(), bioguide_ids)
+
+
+def build_congress(congress, bills, amendments, votes, lis_to_bio=None):
+    """
+    Build a Congress object holding a DataFrame for each of our tables from
+    the row lists produced by process_bills, process_amendments and
+    process_votes. When lis_to_bio is given senate lis_ids in votes_people
+    are replaced with bioguide_ids.
+    """
     congress_obj = Congress(congress)
-    lis_to_bio = lis_to_bio_map(congress['dest'])
 
     logger.debug("made congress object")
     logger.debug(congress_obj)
 
+    rows = dict(bills)
+    rows['amendments'] = amendments
+    rows['votes'] = votes['votes']
+    rows['votes_people'] = votes['people']
+
+    with stats.stage('dataframe'):
+        for table, filename, columns in TABLES:
+            if isinstance(rows.get(table), TallyColumns):
+                setattr(congress_obj, table, rows[table].to_frame())
+                continue
+            setattr(congress_obj, table,
+                    typed_frame(table, rows.get(table, [])))
+
+        if lis_to_bio:
+            congress_obj.votes_people['bioguide_id'] = remap_lis_ids(
+                congress_obj.votes_people['bioguide_id'], lis_to_bio)
+
+    # Dates and categoricals are converted a whole column at a time, once
+    # every row is in.
+    with stats.stage('normalize'):
+        for table, filename, columns in TABLES:
+            normalize_frame(table, getattr(congress_obj, table))
+
+    return congress_obj
+
+
+def save_congress_rows(congress, rows, lis_to_bio=None):
+    """
+    Build and save a congress from a single dict of tables, the shape
+    process_document produces, filling in the placeholder rows process_*
+    would have used for empty tables.
+    """
+    amendments = rows['amendments'] if rows['amendments'] else \
+        [empty_row('amendments')]
+    votes = {'votes': rows['votes'] if rows['votes'] else [empty_row('votes')],
+             'people': rows['votes_people'] if rows['votes_people'] else
+             [empty_row('votes_people')]}
+
+    if lis_to_bio is None:
+        lis_to_bio = congress_lis_map(congress)
+
+    congress_obj = build_congress(congress, rows, amendments, votes,
+                                  lis_to_bio)
+    save_congress(congress_obj, congress['dest'],
+                  congress.get('format', 'csv'), congress.get('sink'),
+                  congress.get('matrix', False))
+
+
+def convert_congress(congress):
+    """
+    Recurse the passed govtrack congress directory and convert it's contents
+    to a set of csv files from the legislation contained therein.
+    :return dict: the per stage stats of the conversion if congress['stats']
+    is set, otherwise None
+    """
+
+    logger.info("Begin processing Congress %s", congress['congress'])
+
+    if congress.get('stats'):
+        stats.start(congress['congress'])
+
+    try:
+        if congress.get('incremental'):
+            convert_congress_incremental(congress)
+        elif congress.get('stream'):
+            stream_congress(congress)
+        else:
+            convert_congress_in_memory(congress)
+    finally:
+        collected = stats.stop()
+
+    return collected
+
+
+def convert_congress_in_memory(congress):
+    """
+    Convert a congress by extracting all of it into row lists and building
+    the DataFrames from those in one go.
+    """
     # We construct lists that can be used to construct dataframes.  Adding to
     # dataframes is expensive so we don't do  that.
 
-    bills = process_bills(congress)
-    amendments = process_amendments(congress)
-    votes = process_votes(congress, lis_to_bio)
+    paths = congress_paths(congress, KINDS)
+    bills = process_bills(congress, paths['bills'])
+    amendments = process_amendments(congress, paths['amendments'])
+    votes = process_votes(congress, paths['votes'])
 
     try:
 
-        logger.debug(" ======================  SAVING {}".format(congress))
-
-        congress_obj.legislation = pd.DataFrame(bills['legislation'] if bills[
-            'legislation'] else [[None] * 12])
-        congress_obj.legislation.columns = [
-            'congress', 'bill_id', 'bill_type', 'introduced_at', 'number',
-            'official_title', 'popular_title', 'short_title', 'status',
-            'status_at', 'top_subject', 'updated_at'
-        ]
-
-        f = [s for s in bills['sponsors'] if s]
-        sponsors = f if f else [[None] * 5]
-        congress_obj.sponsors = pd.DataFrame(sponsors)
-        congress_obj.sponsors.columns = [
-            'type', 'thomas_id', 'bill_id', 'district', 'state'
-        ]
-
-        c = [s for s in bills['cosponsors'] if len(s) > 0]
-        cosponsors = c if c else [[None] * 5]
-        congress_obj.cosponsors = pd.DataFrame(cosponsors)
-        congress_obj.sponsors.columns = [
-            'type', 'thomas_id', 'bill_id', 'district', 'state'
-        ]
-
-        c = [s for s in bills['committees'] if len(s) > 0]
-        committees = c if c else [[None] * 4]
-        congress_obj.committees = pd.DataFrame(committees)
-        congress_obj.committees.columns = [
-            'type', 'name', 'committee_id', 'bill_id'
-        ]
-
-        s = [s for s in bills['subjects'] if len(s) > 0]
-        subjects = s if s else [[None] * 3]
-        congress_obj.subjects = pd.DataFrame(subjects)
-        congress_obj.subjects.columns = ['bill_id', 'bill_type', 'subject']
-
-        e = [s for s in bills['events'] if len(s) > 0]
-        events = e if e else [[None] * 16]
-        congress_obj.events = pd.DataFrame(events)
-        congress_obj.events.columns = [
-            'bill_id', 'acted_at', 'how', 'result', 'roll', 'status',
-            'suspension', 'text', 'type', 'vote_type', 'where', 'calander',
-            'number', 'under', 'committee', 'committees'
-        ]
-
-        # Amendment data is not avalible for all congresses
-        if amendments:
-            congress_obj.amendments = pd.DataFrame(amendments)
-            congress_obj.amendments.columns = [
-                'amendment_id', 'amendment_type', 'amends_amendment',
-                'amends_bill', 'amends_treaty', 'chamber', 'congress',
-                'description', 'introduced', 'number', 'proposed', 'purpose',
-                'sponsor_id', 'committee_id', 'sponsor_type', 'status',
-                'updated'
-            ]
-
-        congress_obj.votes = pd.DataFrame(votes['votes'])
-        congress_obj.votes.columns = ['amendment_id', 'bill_id', 'category',
-                                      'congress', 'chamber', 'date', 'number',
-                                      'requires', 'result', 'result_text',
-                                      'session', 'type', 'updated_at',
-                                      'vote_id', 'yes', 'no', 'not_voting',
-                                      'present']
-
-        congress_obj.votes_people = pd.DataFrame(votes['people'])
-        congress_obj.votes_people.columns = ['vote', 'vote_id', 'bioguide_id',
-                                             'party', 'state', 'date']
-
-        save_congress(congress_obj, congress['dest'])
+        logger.debug(" ======================  SAVING %s", congress)
+
+        congress_obj = build_congress(congress, bills, amendments, votes,
+                                      congress_lis_map(congress))
+        save_congress(congress_obj, congress['dest'],
+                      congress.get('format', 'csv'), congress.get('sink'),
+                      congress.get('matrix', False))
 
     except Exception as e:
         logger.error(
             "################### ERRROR SAVING ########################")
-        logger.error("congress {0}".format(congress))
+        logger.error("congress %s", congress['congress'])
         exc_type, exc_obj, exc_tb = sys.exc_info()
         fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
         raise e
+
+
+def congress_saved(congress, congress_dir, fmt):
+    if congress.get('sink'):
+        return open_sink(congress['sink']).has_congress(congress['congress'])
+    if congress.get('matrix') and not has_rollcall_matrices(congress_dir):
+        return False
+    return os.path.exists(
+        file_path("{0}/legislation".format(congress_dir), fmt))
+
+
+def convert_congress_incremental(congress):
+    """
+    Convert a congress reusing the rows recorded in its manifest for every
+    data.json that has not changed since the last run. Only new or modified
+    documents are decoded and extracted, and the csv files are only rewritten
+    when something changed.
+    """
+    if congress.get('archive'):
+        raise ValueError("Incremental conversion needs an extracted "
+                         "snapshot, not {0}".format(congress['archive']))
+    congress_dir = make_congress_dir(congress['congress'], congress['dest'])
+    manifest = Manifest.load("{0}/{1}".format(congress_dir, MANIFEST_FILE))
+
+    fmt = congress.get('format', 'csv')
+    lis_to_bio = congress_lis_map(congress)
+    manifest.set_lis_map(lis_to_bio)
+
+    src_dir = "{0}/{1}".format(congress['src'], congress['congress'])
+    extracted = manifest.refresh(
+        list_documents(congress), src_dir,
+        process_document)
+
+    logger.info("Congress %s: %s of %s documents changed",
+                congress['congress'], extracted, len(manifest.documents))
+
+    if not manifest.stale and congress_saved(congress, congress_dir, fmt):
+        if manifest.changed:
+            manifest.save()
+        logger.info("Congress %s is up to date", congress['congress'])
+        return
+
+    save_congress_rows(congress, manifest.rows(), lis_to_bio)
+
+    # Only record the new state once the csv files made it to disk.
+    manifest.save()
+
+
+def stream_congress(congress, buffer_rows=BUFFER_ROWS):
+    """
+    Convert a congress without ever holding it in memory. Every document's
+    rows go straight into an open csv writer per table, so memory stays flat
+    no matter how big the congress is.
+    """
+    lis_to_bio = congress_lis_map(congress)
+    congress_dir = "{0}/{1}".format(congress['dest'], congress['congress'])
+    source = congress_source(congress)
+
+    with replace_dir(congress_dir) as tmp_dir:
+        writers = {}
+        for table, filename, columns in TABLES:
+            writers[table] = TableWriter(
+                "{0}/{1}".format(tmp_dir, filename), columns, buffer_rows,
+                date_columns(table))
+
+        try:
+            for kind, path in list_documents(congress):
+                data = process_document(kind,
+                                        read_document(path, source))
+                data['votes_people'] = [
+                    t._replace(bioguide_id=lis_to_bio.get(t.bioguide_id,
+                                                          t.bioguide_id))
+                    for t in data['votes_people']]
+                with stats.stage('write'):
+                    for table, rows in data.items():
+                        writers[table].writerows(rows)
+                stats.count('write',
+                            rows=sum(len(r) for r in data.values()))
+        finally:
+            with stats.stage('write'):
+                for writer in writers.values():
+                    writer.close()
+            stats.count('write', files=len(writers))
+
+        if congress.get('matrix'):
+            # The only tables we need back, read once they are complete.
+            with stats.stage('write'):
+                save_rollcall_matrices(
+                    read_frame("{0}/votes".format(tmp_dir)),
+                    read_frame("{0}/votes_people".format(tmp_dir)), tmp_dir)
@@ -0,0 +1,283 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Read rows straight out of a govtrack snapshot without converting whole
+congresses, for services that only need a few of them:
+
+    for event in iter_bills('/data/govtrack', '114', since='2016-01-01',
+                            table='events'):
+        ...
+
+Every function is a generator yielding the row types of govtrack2csv.schema
+one data.json at a time, built by the same extract functions the converter
+uses, so nothing is held in memory. The snapshot can be a directory or an
+archive of one, see govtrack2csv.source.
+
+The filters are pushed down as far as they go. chamber and bill_type are
+read off each document's path, so documents of other chambers or types are
+never opened. since is checked against the updated_at found in the raw
+bytes with a regex, so documents that were not updated since are never
+decoded. Every row is checked again after decoding.
+"""
+
+import os
+import re
+
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from govtrack2csv import CONGRESS_DIR
+from govtrack2csv import process_document
+from govtrack2csv import read_document
+from govtrack2csv.source import archive_type, congress_source
+from govtrack2csv.util import datestring_to_datetime
+
+
+__author__ = 'vance@hackthefed.org'
+
+BILL_TABLES = ['legislation', 'sponsors', 'cosponsors', 'subjects',
+               'committees', 'events']
+
+HOUSE = 'h'
+SENATE = 's'
+
+# govtrack times are Eastern wall clock time.
+EASTERN = 'America/New_York'
+
+UPDATED_AT = re.compile(br'"updated_at"\s*:\s*"([^"]*)"')
+
+# <kind>/<bill or amendment type, or session>/<document>/data.json
+DOCUMENT_PATH = dict(
+    (kind, re.compile(r'(?:^|/){0}/([^/]+)/([^/]+)/data\.json$'.format(kind)))
+    for kind in ('bills', 'amendments', 'votes'))
+
+
+def snapshot_congress(src, congress):
+    """
+    The congress dict for a congress of the snapshot at src.
+    """
+    if archive_type(src) is not None:
+        return {'congress': congress, 'src': src, 'archive': src}
+    return {'congress': congress, 'src': os.path.join(src, CONGRESS_DIR)}
+
+
+def as_datetime(value):
+    """
+    since as a naive datetime, given a datetime, a date or a govtrack date
+    string. A timezone aware datetime is converted to Eastern wall clock
+    time, what govtrack's times are compared in.
+    """
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(ZoneInfo(EASTERN)).replace(tzinfo=None)
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datestring_to_datetime(value)
+
+
+def as_set(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return {value}
+    return set(value)
+
+
+def type_chamber(document_type):
+    """
+    The chamber of a bill or amendment type, hr, sjres, hamdt, supamdt...
+    """
+    return HOUSE if document_type.startswith('h') else SENATE
+
+
+def path_fields(kind, path):
+    """
+    Returns (chamber, bill type) as far as a document's path tells them,
+    None for whatever it doesn't.
+    """
+    match = DOCUMENT_PATH[kind].search(path.replace(os.sep, '/'))
+    if match is None:
+        return None, None
+    first, second = match.groups()
+    if kind == 'votes':
+        return second[:1], None
+    if kind == 'bills':
+        return type_chamber(first), first
+    return type_chamber(first), None
+
+
+def wanted_path(kind, path, chambers, bill_types):
+    chamber, bill_type = path_fields(kind, path)
+    if chambers is not None and chamber is not None and \
+            chamber not in chambers:
+        return False
+    if bill_types is not None and bill_type is not None and \
+            bill_type not in bill_types:
+        return False
+    return True
+
+
+def updated_since(content, since):
+    """
+    False only when the updated_at of an undecoded document is before since.
+    Documents with no, or more than one, updated_at are left to the check
+    after decoding.
+    """
+    found = UPDATED_AT.findall(content)
+    if len(found) != 1:
+        return True
+    try:
+        updated = datestring_to_datetime(found[0].decode('ascii'))
+    except ValueError:
+        return True
+    return updated is None or updated >= since
+
+
+def updated(value, since):
+    if since is None:
+        return True
+    try:
+        value = datestring_to_datetime(value)
+    except (TypeError, ValueError):
+        return False
+    return value is not None and value >= since
+
+
+def iter_documents(src, congress, kind, since=None, chamber=None,
+                   bill_type=None):
+    """
+    Yields the content of every data.json of a kind in a congress of the
+    snapshot at src that the filters can't rule out without decoding it.
+    since must be a datetime, chamber and bill_type sets.
+    """
+    congress = snapshot_congress(src, congress)
+    source = congress_source(congress)
+
+    if source.random_access:
+        documents = ((entry.path, None) for entry in
+                     source.scan(congress['congress'], [kind]))
+    else:
+        # A compressed archive is read front to back, paths and content
+        # arrive together.
+        documents = ((member, content) for name, member_kind, member, content
+                     in source.stream_members({congress['congress']})
+                     if member_kind == kind)
+
+    for path, content in documents:
+        if not wanted_path(kind, path, chamber, bill_type):
+            continue
+        if content is None:
+            content = read_document(path, source)
+        if since is not None and not updated_since(content, since):
+            continue
+        yield content
+
+
+def iter_bills(src, congress, since=None, chamber=None, bill_type=None,
+               table='legislation'):
+    """
+    Yields the rows of one of the bill tables, legislation, sponsors,
+    cosponsors, subjects, committees or events, for the bills of a congress
+    updated since a date, in a chamber ('h' or 's') and of a bill type
+    (hr, s, hres...). chamber and bill_type may also be lists.
+    """
+    if table not in BILL_TABLES:
+        raise ValueError("{0} is not one of the bill tables {1}".format(
+            table, ", ".join(BILL_TABLES)))
+    since = as_datetime(since)
+    chamber = as_set(chamber)
+    bill_type = as_set(bill_type)
+
+    for content in iter_documents(src, congress, 'bills', since, chamber,
+                                  bill_type):
+        data = process_document('bills', content)
+        if not data['legislation']:
+            continue
+        bill = data['legislation'][0]
+        if not updated(bill.updated_at, since):
+            continue
+        if chamber is not None and (
+                not bill.bill_type or
+                type_chamber(bill.bill_type) not in chamber):
+            continue
+        if bill_type is not None and bill.bill_type not in bill_type:
+            continue
+        for row in data[table]:
+            yield row
+
+
+def iter_amendments(src, congress, since=None, chamber=None):
+    """
+    Yields the Amendment rows of a congress's amendments updated since a
+    date and offered in a chamber.
+    """
+    since = as_datetime(since)
+    chamber = as_set(chamber)
+
+    for content in iter_documents(src, congress, 'amendments', since,
+                                  chamber):
+        for amendment in process_document('amendments', content)[
+                'amendments']:
+            if not updated(amendment.updated, since):
+                continue
+            if chamber is not None and amendment.chamber not in chamber:
+                continue
+            yield amendment
+
+
+def iter_roll_calls(src, congress, since, chamber):
+    """
+    Yields the rows, keyed by table, of every up or down roll call that
+    matches.
+    """
+    for content in iter_documents(src, congress, 'votes', since, chamber):
+        data = process_document('votes', content)
+        if not data['votes']:
+            continue
+        vote = data['votes'][0]
+        if not updated(vote.updated_at, since):
+            continue
+        if chamber is not None and vote.chamber not in chamber:
+            continue
+        yield data
+
+
+def iter_votes(src, congress, since=None, chamber=None):
+    """
+    Yields the Vote rows of a congress's up or down roll calls updated since
+    a date and held in a chamber.
+    """
+    for data in iter_roll_calls(src, congress, as_datetime(since),
+                                as_set(chamber)):
+        for vote in data['votes']:
+            yield vote
+
+
+def iter_vote_tallies(src, congress, since=None, chamber=None,
+                      lis_to_bio=None):
+    """
+    Yields a VoteTally row for every member's vote in the roll calls
+    iter_votes yields. Senate tallies that use lis_ids get the bioguide_id
+    from lis_to_bio when it is given, see lis_map_from_legislators.
+    """
+    for data in iter_roll_calls(src, congress, as_datetime(since),
+                                as_set(chamber)):
+        for tally in data['votes_people']:
+            if lis_to_bio:
+                tally = tally._replace(bioguide_id=lis_to_bio.get(
+                    tally.bioguide_id, tally.bioguide_id))
+            yield tally
@@ -0,0 +1,137 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Where a run of bin/convert_congress got to. The state of every congress,
+pending, running, done or failed, is written to a checkpoint file in the
+destination as it changes, so a run that died or had congresses fail picks
+up where it stopped: congresses that were done are skipped, the rest are
+converted again. A run that converts everything removes its checkpoint.
+"""
+
+import json
+import logging
+import os
+import time
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = '.convert_state.json'
+CHECKPOINT_VERSION = 1
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Checkpoint(object):
+    """
+    The state, attempt count and last error of every congress of a run.
+    options are the settings that change the output (format, sink...), a
+    checkpoint left by a run with other options is not resumed.
+    """
+
+    def __init__(self, path, options=None, jobs=None):
+        self.path = path
+        self.options = options if options is not None else {}
+        self.jobs = jobs if jobs is not None else {}
+
+    @classmethod
+    def load(cls, path, options=None):
+        """
+        Resume the checkpoint at path, or start a new one if there is none or
+        it was written with different options.
+        """
+        options = options if options is not None else {}
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return cls(path, options)
+
+        if data.get('version') != CHECKPOINT_VERSION:
+            return cls(path, options)
+        if data.get('options') != options:
+            logger.info("Not resuming %s, it was written with other options",
+                        path)
+            return cls(path, options)
+
+        checkpoint = cls(path, options, data.get('jobs', {}))
+        done = checkpoint.names(DONE)
+        if done:
+            logger.info("Resuming from %s, %s congresses already done", path,
+                        len(done))
+        return checkpoint
+
+    def save(self):
+        tmp_path = "{0}.tmp".format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CHECKPOINT_VERSION,
+                       'options': self.options,
+                       'jobs': self.jobs}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def state(self, name):
+        return self.jobs.get(name, {}).get('state', PENDING)
+
+    def attempts(self, name):
+        return self.jobs.get(name, {}).get('attempts', 0)
+
+    def mark(self, name, state, error=None):
+        """
+        Record a congress's new state and save. Moving to running counts as
+        an attempt.
+        """
+        job = self.jobs.setdefault(name, {'state': PENDING, 'attempts': 0})
+        job['state'] = state
+        job['updated'] = time.time()
+        if state == RUNNING:
+            job['attempts'] += 1
+        if error is not None:
+            job['error'] = error
+        elif state == DONE:
+            job.pop('error', None)
+        self.save()
+
+    def names(self, state):
+        return sorted(name for name in self.jobs
+                      if self.jobs[name]['state'] == state)
+
+    def todo(self, congresses):
+        """
+        The congress dicts that still need converting. Anything left running
+        was interrupted, it runs again.
+        """
+        for congress in congresses:
+            self.jobs.setdefault(congress['congress'],
+                                 {'state': PENDING, 'attempts': 0})
+        self.save()
+        return [c for c in congresses if self.state(c['congress']) != DONE]
+
+    def finish(self):
+        """
+        Remove the checkpoint once every congress is done, the next run
+        starts from scratch. Returns the names of the congresses that are
+        not done.
+        """
+        unfinished = sorted(name for name in self.jobs
+                            if self.jobs[name]['state'] != DONE)
+        if not unfinished and os.path.exists(self.path):
+            os.remove(self.path)
+        return unfinished
@@ -0,0 +1,213 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Concatenate the per congress files of a table into one file.
+
+csv files are never parsed. We find where each file's header ends, size the
+output up front, give every file its own segment of it and copy the files
+into their segments in parallel with copy_file_range or sendfile, so the
+kernel moves the bytes and the output comes out in congress order no matter
+which copy finishes first.
+"""
+
+import logging
+import os
+
+from multiprocessing.pool import ThreadPool
+
+from govtrack2csv.output import CHUNK_ROWS
+from govtrack2csv.output import ChunkWriter
+from govtrack2csv.output import iter_table
+from govtrack2csv.output import table_files
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER = 1024 * 1024
+HEADER_PROBE = 64 * 1024
+THREADS = 4
+
+
+def read_header(path):
+    """
+    Returns the first line of a csv file, newline included.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline(HEADER_PROBE)
+    if header and not header.endswith(b'\n'):
+        raise ValueError("No header line in {0}".format(path))
+    return header
+
+
+def plan_segments(paths):
+    """
+    Work out where each file's rows go in the combined file. The first file
+    is copied whole, the others from the end of their header on.
+    :return tuple: the segments, (path, src_offset, length, dest_offset,
+    needs_newline) each, and the total size of the combined file
+    """
+    segments = []
+    dest_offset = 0
+    first_header = None
+
+    for path in paths:
+        header = read_header(path)
+        size = os.path.getsize(path)
+        if first_header is None:
+            first_header = header
+            src_offset = 0
+        else:
+            if header != first_header:
+                logger.warning("%s has a different header, copying its rows "
+                               "anyway", path)
+            src_offset = len(header)
+
+        length = size - src_offset
+        needs_newline = length > 0 and not ends_with_newline(path, size)
+        segments.append((path, src_offset, length, dest_offset,
+                         needs_newline))
+        dest_offset += length + needs_newline
+
+    return segments, dest_offset
+
+
+def ends_with_newline(path, size):
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        return f.read(1) == b'\n'
+
+
+def copy_range(src_fd, dest_fd, src_offset, length, dest_offset):
+    """
+    Copy length bytes between two file descriptors at the given offsets,
+    letting the kernel do it where it can.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while length > 0:
+                copied = os.copy_file_range(src_fd, dest_fd, length,
+                                            src_offset, dest_offset)
+                if copied == 0:
+                    break
+                src_offset += copied
+                dest_offset += copied
+                length -= copied
+            if length == 0:
+                return
+        except OSError:
+            # Cross device or unsupported file system, fall through.
+            pass
+
+    if hasattr(os, 'sendfile'):
+        try:
+            os.lseek(dest_fd, dest_offset, os.SEEK_SET)
+            while length > 0:
+                copied = os.sendfile(dest_fd, src_fd, src_offset, length)
+                if copied == 0:
+                    break
+                src_offset += copied
+                dest_offset += copied
+                length -= copied
+            if length == 0:
+                return
+        except OSError:
+            # sendfile only writes to sockets on some platforms.
+            pass
+
+    while length > 0:
+        chunk = os.pread(src_fd, min(COPY_BUFFER, length), src_offset)
+        if not chunk:
+            raise IOError("File shrank while copying it")
+        os.pwrite(dest_fd, chunk, dest_offset)
+        src_offset += len(chunk)
+        dest_offset += len(chunk)
+        length -= len(chunk)
+
+
+def copy_segment(dest_path, segment):
+    path, src_offset, length, dest_offset, needs_newline = segment
+    logger.info("processing %s", path)
+    src_fd = os.open(path, os.O_RDONLY)
+    dest_fd = os.open(dest_path, os.O_WRONLY)
+    try:
+        copy_range(src_fd, dest_fd, src_offset, length, dest_offset)
+        if needs_newline:
+            os.pwrite(dest_fd, b'\n', dest_offset + length)
+    finally:
+        os.close(src_fd)
+        os.close(dest_fd)
+
+
+def concat_csv(paths, dest_path, threads=THREADS):
+    """
+    Concatenate csv files into dest_path keeping only the first file's
+    header. The files are copied concurrently into pre-sized segments of
+    dest_path, in the order given.
+    :return int: the size of dest_path
+    """
+    segments, total = plan_segments(paths)
+
+    with open(dest_path, 'wb') as f:
+        f.truncate(total)
+
+    if threads > 1 and len(segments) > 1:
+        pool = ThreadPool(min(threads, len(segments)))
+        try:
+            pool.map(lambda s: copy_segment(dest_path, s), segments,
+                     chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for segment in segments:
+            copy_segment(dest_path, segment)
+
+    return total
+
+
+def consolidate_table(src, filename, dest_path, fmt='csv', threads=THREADS,
+                      chunk_rows=CHUNK_ROWS):
+    """
+    Combine one table's file from every congress directory under src, in
+    congress order, into dest_path (without extension).
+    """
+    logger.info("consolidating %s", filename)
+    if fmt == 'csv':
+        return concat_csv(table_files(src, filename, fmt),
+                          "{0}.csv".format(dest_path), threads)
+
+    # Parquet and arrow files carry their own schema so there are no
+    # headers to strip, we just scan every congress's file into one table.
+    writer = ChunkWriter(dest_path, fmt)
+    try:
+        for table in iter_table(src, filename, fmt, chunk_rows):
+            writer.write_arrow(table)
+    finally:
+        writer.close()
+
+
+def consolidate_votes(src, dest, fmt='csv', threads=THREADS,
+                      chunk_rows=CHUNK_ROWS):
+    """
+    Combine the votes and votes_people files of every congress under src
+    into all_votes and all_votes_people in dest.
+    """
+    for filename, out in (('votes.csv', 'all_votes'),
+                          ('votes_people.csv', 'all_votes_people')):
+        consolidate_table(src, filename, "{0}/{1}".format(dest, out), fmt,
+                          threads, chunk_rows)
@@ -0,0 +1,179 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Estimate how long each congress will take before converting any of them, so
+the scheduler can hand out the longest jobs first (LPT), and compare the
+makespan that predicts with the one we actually got.
+
+The estimate is a linear model of the number and size of the data.json
+files of each kind, found with one stat-ing scan of the congress or from
+the listing of its archive. The weights were measured on the synthetic tree
+in benchmarks/, only their ratios matter for the ordering. The report's
+actual / predicted ratio says how far off they are on your machine.
+"""
+
+import heapq
+import math
+
+from collections import namedtuple
+
+from govtrack2csv import stats
+from govtrack2csv.scan import KINDS
+from govtrack2csv.source import congress_source
+
+
+__author__ = 'vance@hackthefed.org'
+
+# Building the frames and opening the output files, paid once per congress.
+CONGRESS_SECONDS = 0.1
+# Opening and decoding a file, and extracting, writing its rows.
+FILE_SECONDS = {'bills': 5e-05, 'amendments': 2e-05, 'votes': 5e-05}
+BYTE_SECONDS = {'bills': 2e-08, 'amendments': 1.5e-08, 'votes': 2.5e-08}
+
+Estimate = namedtuple('Estimate', ['congress', 'files', 'bytes', 'seconds'])
+
+
+def estimate_entries(congress, entries):
+    """
+    The Estimate for a congress from the ScanEntry list of a stat-ing scan.
+    """
+    seconds = CONGRESS_SECONDS
+    total = 0
+    for entry in entries:
+        seconds += FILE_SECONDS[entry.kind] + \
+            BYTE_SECONDS[entry.kind] * entry.size
+        total += entry.size
+    return Estimate(congress, len(entries), total, seconds)
+
+
+def estimate_congress(congress):
+    """
+    Scan a congress dict's source and estimate its cost. The entries the
+    scan found are kept in the dict under 'entries', converting the congress
+    lists its documents from them instead of scanning it again.
+    """
+    with stats.stage('walk'):
+        entries = congress_source(congress).scan(congress['congress'], KINDS,
+                                                 with_stat=True)
+    congress['entries'] = entries
+    return estimate_entries(congress['congress'], entries)
+
+
+def estimate_costs(congresses, collected=None):
+    """
+    Returns a dict of congress name to Estimate for every congress dict.
+    The walk stats of the congresses that asked for them are appended to
+    collected.
+    """
+    estimates = {}
+    for congress in congresses:
+        if congress.get('stats'):
+            stats.start(congress['congress'])
+        estimates[congress['congress']] = estimate_congress(congress)
+        walk_stats = stats.stop()
+        if collected is not None and walk_stats:
+            collected.append(walk_stats)
+    return estimates
+
+
+def longest_first(congresses, estimates):
+    """
+    Order congress dicts by estimated cost, largest first, ties by name.
+    """
+    return sorted(congresses, key=lambda c: (
+        -estimates[c['congress']].seconds, c['congress']))
+
+
+def job_costs(estimates, batch_size=0):
+    """
+    The cost of every job the pool will run. With a batch size a congress is
+    split into batches of that many files that cost the same.
+    """
+    costs = []
+    for estimate in estimates.values():
+        if batch_size and estimate.files:
+            pieces = int(math.ceil(estimate.files / float(batch_size)))
+            costs.extend([estimate.seconds / pieces] * pieces)
+        else:
+            costs.append(estimate.seconds)
+    return costs
+
+
+def predict_makespan(costs, workers):
+    """
+    When the last worker finishes if costs are handed out longest first,
+    each to whichever worker frees up first.
+    """
+    loads = [0.0] * max(workers, 1)
+    for cost in sorted(costs, reverse=True):
+        heapq.heappush(loads, heapq.heappop(loads) + cost)
+    return max(loads)
+
+
+def makespan_report(estimates, timings, workers, wall, batch_size=0):
+    """
+    Compare the predicted makespan, and each congress's predicted cost, with
+    what the run measured. timings holds the seconds the workers spent on
+    each congress and wall the time the whole conversion took.
+    """
+    costs = job_costs(estimates, batch_size)
+    predicted = predict_makespan(costs, workers)
+    by_workers = dict((str(n), predict_makespan(costs, n))
+                      for n in range(1, workers * 2 + 1))
+
+    congresses = {}
+    for name, estimate in estimates.items():
+        congresses[name] = {'files': estimate.files, 'bytes': estimate.bytes,
+                            'predicted': estimate.seconds,
+                            'actual': timings.get(name)}
+
+    predicted_work = sum(e.seconds for n, e in estimates.items()
+                         if n in timings)
+    actual_work = sum(timings.values())
+    return {'workers': workers,
+            'batch_size': batch_size,
+            'predicted_makespan': predicted,
+            'actual_makespan': wall,
+            'predicted_work': sum(costs),
+            'actual_work': actual_work,
+            'ratio': actual_work / predicted_work if predicted_work else None,
+            'predicted_makespan_by_workers': by_workers,
+            'congresses': congresses}
+
+
+def makespan_summary(report):
+    """
+    A few lines on how the schedule went and whether more workers would
+    help.
+    """
+    ratio = report['ratio'] or 1.0
+    lines = ["Makespan {0:.1f}s, predicted {1:.1f}s on {2} workers "
+             "(actual / predicted work {3:.2f})".format(
+                 report['actual_makespan'],
+                 report['predicted_makespan'] * ratio, report['workers'],
+                 ratio)]
+
+    by_workers = report['predicted_makespan_by_workers']
+    best = min(by_workers.values())
+    enough = min(int(n) for n, span in by_workers.items()
+                 if span <= best * 1.01)
+    if enough < report['workers']:
+        lines.append("The largest jobs bound the run, {0} workers would "
+                     "finish as soon".format(enough))
+    elif enough > report['workers']:
+        lines.append("{0} workers would take a predicted {1:.1f}s".format(
+            enough, best * ratio))
+    return "\n".join(lines)
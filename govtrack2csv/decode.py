@@ -0,0 +1,164 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+JSON decoding for the data.json files. We decode hundreds of thousands of
+them so we use the fastest decoder that is installed: orjson, simdjson or
+ujson, falling back to the standard library json module.
+
+Set GOVTRACK2CSV_JSON (or call set_backend) to pick one by hand. If it
+names a backend that is not installed we warn and pick one as usual.
+"""
+
+import json
+import logging
+import os
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ['orjson', 'simdjson', 'ujson', 'json']
+BACKEND_ENV = 'GOVTRACK2CSV_JSON'
+
+_backend = None
+_loads = None
+_load_fields = None
+
+
+def _full_load_fields(content, fields):
+    # Copying the wanted keys out of a fully decoded document costs more than
+    # it saves, so backends without lazy parsing just hand back everything.
+    return _loads(content)
+
+
+def _import_backend(name):
+    """
+    Returns (loads, load_fields) for a backend, raises ImportError if the
+    module is not installed.
+    """
+    if name == 'orjson':
+        import orjson
+        return orjson.loads, _full_load_fields
+
+    if name == 'simdjson':
+        import simdjson
+        parser = simdjson.Parser()
+
+        def simd_loads(content):
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            return simdjson.loads(content)
+
+        def simd_load_fields(content, fields):
+            # The parser hands back lazy proxies, only the fields we ask for
+            # are ever turned into python objects.
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            doc = parser.parse(content)
+            data = {}
+            for k in fields:
+                if k in doc:
+                    v = doc[k]
+                    if isinstance(v, simdjson.Object):
+                        v = v.as_dict()
+                    elif isinstance(v, simdjson.Array):
+                        v = v.as_list()
+                    data[k] = v
+            return data
+
+        return simd_loads, simd_load_fields
+
+    if name == 'ujson':
+        import ujson
+        return ujson.loads, _full_load_fields
+
+    if name == 'json':
+        return json.loads, _full_load_fields
+
+    raise ValueError("Unknown json backend: {0}".format(name))
+
+
+def set_backend(name=None):
+    """
+    Select the backend to decode with. With no name we use the first of
+    BACKENDS that imports. Raises ImportError if the named one is not
+    installed and ValueError if it is not one of BACKENDS.
+    """
+    global _backend, _loads, _load_fields
+
+    candidates = [name] if name else BACKENDS
+    for candidate in candidates:
+        try:
+            _loads, _load_fields = _import_backend(candidate)
+        except ImportError:
+            if name:
+                raise
+            continue
+        _backend = candidate
+        return _backend
+
+
+def backend():
+    return _backend
+
+
+def available_backends():
+    """
+    Returns the names of the backends that can be imported here.
+    """
+    names = []
+    for name in BACKENDS:
+        try:
+            _import_backend(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+def loads(content):
+    """
+    Decode a whole document from str or bytes.
+    """
+    return _loads(content)
+
+
+def load_fields(content, fields):
+    """
+    Decode a document for reading the top level keys in fields. With
+    simdjson only those keys are materialized and missing keys are left out,
+    so .get() and [] behave as on the full document. Other backends return
+    the full document.
+    """
+    return _load_fields(content, fields)
+
+
+def set_backend_from_env():
+    """
+    Select the backend GOVTRACK2CSV_JSON names, or the first that imports
+    when it is unset or names one we can't use.
+    """
+    name = os.environ.get(BACKEND_ENV)
+    if name:
+        try:
+            return set_backend(name)
+        except (ImportError, ValueError) as e:
+            logger.warning("Ignoring %s=%s: %s", BACKEND_ENV, name, e)
+    return set_backend()
+
+
+set_backend_from_env()
@@ -0,0 +1,70 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Logging setup for the command line scripts. The library modules only create
+loggers, it is up to whoever runs them to decide where records go.
+
+Pool workers don't write to stderr themselves. They put their records on a
+queue and a single listener thread in the parent writes them out, so workers
+never fight over the stderr lock.
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+
+
+__author__ = 'vance@hackthefed.org'
+
+FORMAT = '[%(levelname)s/%(processName)s] %(message)s'
+LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Send this process's log records at level and above to stderr.
+    :return logging.Handler: the stderr handler
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(FORMAT))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    return handler
+
+
+def start_log_listener(level=logging.INFO):
+    """
+    Configure logging for the parent process and start the thread that
+    writes out the records the pool workers queue.
+    :return tuple: the queue to hand to worker_logging and the listener,
+    stop() it once the pool is done
+    """
+    handler = configure_logging(level)
+    queue = multiprocessing.Queue(-1)
+    listener = logging.handlers.QueueListener(queue, handler)
+    listener.start()
+    return queue, listener
+
+
+def worker_logging(queue, level=logging.INFO):
+    """
+    Route this process's log records through queue. Records below level are
+    dropped before they are ever formatted or queued.
+    """
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(queue)]
+    root.setLevel(level)
@@ -0,0 +1,164 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Per congress manifest of the documents we have already converted. Used by the
+incremental mode of convert_congress so a rerun only re-extracts the
+data.json files that actually changed.
+
+The manifest keeps every row extracted from every document as JSON, around
+1.3 times the size of the congress's csv files, and an update rebuilds and
+rewrites all the tables of the congress from those rows. What it saves is
+the decoding and extracting of the documents that did not change.
+"""
+
+import hashlib
+import json
+import os
+
+from collections import defaultdict
+
+
+__author__ = 'vance@hackthefed.org'
+
+MANIFEST_FILE = '.manifest.json'
+MANIFEST_VERSION = 1
+
+
+def content_hash(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+class Manifest(object):
+    """
+    Maps each data.json (relative to the congress source directory) to the
+    mtime, size and content hash we last saw for it along with the rows we
+    extracted from it. changed says the manifest needs saving, stale that
+    the congress's files need rewriting too because a document's content,
+    the set of documents or the legislators changed.
+    """
+
+    def __init__(self, path, documents=None, lis_hash=None):
+        self.path = path
+        self.documents = documents if documents is not None else {}
+        self.lis_hash = lis_hash
+        self.changed = False
+        self.stale = False
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a manifest from disk. A missing, unreadable or out of date
+        manifest gives us an empty one, which means a full rebuild.
+        """
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return cls(path)
+
+        if data.get('version') != MANIFEST_VERSION:
+            return cls(path)
+
+        return cls(path, data.get('documents', {}), data.get('lis_hash'))
+
+    def save(self):
+        """
+        Write the manifest next to the csv files. We write to a temp file and
+        rename so an interrupted run never leaves a truncated manifest.
+        """
+        tmp_path = "{0}.tmp".format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION,
+                       'lis_hash': self.lis_hash,
+                       'documents': self.documents}, f)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+        self.stale = False
+
+    def set_lis_map(self, lis_to_bio):
+        """
+        Vote rows are stored with their original lis_ids and remapped when the
+        csv files are written. If the legislators changed since the last run
+        the files need rewriting even when no document did.
+        """
+        lis_hash = content_hash(
+            json.dumps(sorted(lis_to_bio.items())).encode('utf-8'))
+        if lis_hash != self.lis_hash:
+            self.lis_hash = lis_hash
+            self.changed = True
+            self.stale = True
+
+    def refresh(self, documents, src_dir, extract):
+        """
+        Bring the manifest up to date with the (kind, file_path) pairs in
+        documents. Files whose mtime and size match are trusted as is, files
+        whose content hash matches only get their stat updated, everything
+        else is read and handed to extract(kind, content) for new rows.
+        Entries for files that no longer exist are dropped.
+
+        :return int: the number of documents that were re-extracted
+        """
+        seen = set()
+        extracted = 0
+
+        for kind, file_path in documents:
+            key = os.path.relpath(file_path, src_dir)
+            seen.add(key)
+            stat = os.stat(file_path)
+            entry = self.documents.get(key)
+
+            if (entry and entry['kind'] == kind and
+                    entry['mtime'] == stat.st_mtime_ns and
+                    entry['size'] == stat.st_size):
+                continue
+
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            digest = content_hash(content)
+            self.changed = True
+
+            if entry and entry['kind'] == kind and entry['hash'] == digest:
+                # Touched, or delivered again, with the same content.
+                entry['mtime'] = stat.st_mtime_ns
+                entry['size'] = stat.st_size
+                continue
+
+            self.stale = True
+
+            self.documents[key] = {'kind': kind,
+                                   'mtime': stat.st_mtime_ns,
+                                   'size': stat.st_size,
+                                   'hash': digest,
+                                   'rows': extract(kind, content)}
+            extracted += 1
+
+        for key in set(self.documents) - seen:
+            del self.documents[key]
+            self.changed = True
+            self.stale = True
+
+        return extracted
+
+    def rows(self):
+        """
+        Merge the rows of every document into one dict of tables. Documents
+        are visited in path order so the output is stable between runs.
+        """
+        data = defaultdict(list)
+        for key in sorted(self.documents):
+            for table, rows in self.documents[key]['rows'].items():
+                data[table].extend(rows)
+        return data
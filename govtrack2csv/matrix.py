@@ -0,0 +1,134 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+The roll calls of a congress as a legislator x roll call matrix per chamber,
+the pivot of votes_people every ideal point or party unity analysis starts
+with, saved once at conversion time.
+
+Each chamber gets rollcall_<h|s>.npy, an int8 matrix holding the vote code
+of every member in every roll call, VOTE_CODES order (0 yea, 1 nay, 2 not
+voting, 3 present), or ABSENT where a member has no tally. Line n of
+rollcall_<h|s>_members.csv is the member of row n, of
+rollcall_<h|s>_votes.csv the roll call of column n, in date order.
+load_rollcall_matrix memory maps the matrix, so a whole congress loads at
+once and every process that opens it shares the same pages.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from govtrack2csv.tally import VOTE_CODES
+
+
+__author__ = 'vance@hackthefed.org'
+
+ABSENT = -1
+CHAMBERS = ['h', 's']
+MATRIX_FILE = 'rollcall_{0}'
+
+
+def matrix_files(directory, chamber):
+    """
+    The matrix, members and roll calls files of a chamber.
+    """
+    base = os.path.join(directory, MATRIX_FILE.format(chamber))
+    return ("{0}.npy".format(base), "{0}_members.csv".format(base),
+            "{0}_votes.csv".format(base))
+
+
+def vote_codes(column):
+    """
+    The int8 VOTE_CODES code of every value of a vote column, strings or
+    categorical, ABSENT for anything else.
+    """
+    return pd.Categorical(column, categories=VOTE_CODES).codes.astype(
+        np.int8)
+
+
+def chamber_roll_calls(votes, chamber):
+    """
+    The vote_id and date of every roll call of a chamber, in date order.
+    """
+    roll_calls = votes.loc[(votes['chamber'] == chamber) &
+                           votes['vote_id'].notnull(), ['vote_id', 'date']]
+    roll_calls = roll_calls.astype({'vote_id': object})
+    return roll_calls.sort_values(['date', 'vote_id']).drop_duplicates(
+        'vote_id').reset_index(drop=True)
+
+
+def save_rollcall_matrix(votes, votes_people, directory, chamber):
+    """
+    Pivot a chamber's tallies into its matrix, written straight into the
+    memory mapped .npy, and save the index files next to it.
+    """
+    matrix_path, members_path, votes_path = matrix_files(directory, chamber)
+    roll_calls = chamber_roll_calls(votes, chamber)
+    columns = pd.Index(roll_calls['vote_id'])
+
+    vote_ids = np.asarray(votes_people['vote_id'], dtype=object)
+    tallies = votes_people[columns.get_indexer(vote_ids) >= 0]
+    tallies = tallies[tallies['bioguide_id'].notnull()]
+    members = tallies[['bioguide_id', 'party', 'state']].astype(object) \
+        .drop_duplicates('bioguide_id').sort_values('bioguide_id') \
+        .reset_index(drop=True)
+    rows = pd.Index(members['bioguide_id'])
+
+    matrix = np.lib.format.open_memmap(
+        matrix_path, mode='w+', dtype=np.int8,
+        shape=(len(rows), len(columns)))
+    matrix[:] = ABSENT
+    if len(tallies):
+        matrix[rows.get_indexer(np.asarray(tallies['bioguide_id'],
+                                           dtype=object)),
+               columns.get_indexer(np.asarray(tallies['vote_id'],
+                                              dtype=object))] = \
+            vote_codes(tallies['vote'])
+    matrix.flush()
+    del matrix
+
+    members.to_csv(members_path, index=False)
+    roll_calls.to_csv(votes_path, index=False)
+
+
+def save_rollcall_matrices(votes, votes_people, directory):
+    """
+    Save the matrix of each chamber of a congress from its votes and
+    votes_people tables. Chambers without roll calls get an empty one.
+    """
+    for chamber in CHAMBERS:
+        save_rollcall_matrix(votes, votes_people, directory, chamber)
+
+
+def has_rollcall_matrices(directory):
+    return all(os.path.exists(matrix_files(directory, chamber)[0])
+               for chamber in CHAMBERS)
+
+
+def load_rollcall_matrix(directory, chamber):
+    """
+    Returns (matrix, members, roll calls) for a chamber of the congress
+    saved in directory. The matrix is a read only memory map, members and
+    roll calls DataFrames whose positions are its rows and columns.
+    """
+    matrix_path, members_path, votes_path = matrix_files(directory, chamber)
+    matrix = np.load(matrix_path, mmap_mode='r')
+    members = pd.read_csv(members_path, dtype=str, keep_default_na=False,
+                          na_values=[''])
+    roll_calls = pd.read_csv(votes_path, dtype=str, keep_default_na=False,
+                             na_values=[''])
+    return matrix, members, roll_calls
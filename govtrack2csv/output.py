@@ -0,0 +1,320 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Writing and reading our tables as csv, parquet or arrow (feather v2) files.
+The columnar formats need pyarrow and are written typed and compressed, with
+list columns kept as lists and low cardinality strings dictionary encoded, so
+every congress's file for a table has the same schema.
+"""
+
+import glob
+import os
+import shutil
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+from govtrack2csv.schema import CATEGORIES, COLUMN_TYPES
+
+
+__author__ = 'vance@hackthefed.org'
+
+FORMATS = ['csv', 'parquet', 'arrow']
+COMPRESSION = 'zstd'
+
+# Rows per chunk when a table is streamed instead of loaded whole.
+CHUNK_ROWS = 1000000
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required to write parquet or arrow "
+                          "files: pip3 install pyarrow")
+    return pyarrow
+
+
+def file_path(base, fmt):
+    """
+    Returns the path of a table file given its path without extension.
+    """
+    return "{0}.{1}".format(base, fmt)
+
+
+def _to_string(value):
+    if value is None or value != value:  # None and NaN
+        return None
+    return str(value)
+
+
+def column_to_arrow(pa, name, column, kind):
+    if kind in ('int16', 'int32'):
+        values = pd.to_numeric(column, errors='coerce').astype('Int64')
+        return pa.array(values, type=getattr(pa, kind)(), from_pandas=True)
+    if kind == 'bool':
+        return pa.array(column.astype(object), type=pa.bool_(),
+                        from_pandas=True)
+    if kind == 'list':
+        return pa.array(column.map(lambda v: v if isinstance(v, list)
+                                   else None),
+                        type=pa.list_(pa.string()), from_pandas=True)
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return pa.array(column, from_pandas=True)
+    if pd.api.types.is_numeric_dtype(column) and \
+            not pd.api.types.is_bool_dtype(column):
+        return pa.array(column, from_pandas=True)
+
+    values = pa.array(column.astype(object).map(_to_string),
+                      type=pa.string(), from_pandas=True)
+    if name in CATEGORIES:
+        values = values.dictionary_encode()
+    return values
+
+
+def frame_to_arrow(frame, table=None):
+    """
+    Convert a DataFrame to a pyarrow Table using the types in COLUMN_TYPES
+    for the named table. Columns we know nothing about keep their numeric
+    type or become strings.
+    """
+    pa = import_pyarrow()
+    types = COLUMN_TYPES.get(table, {})
+    columns = [column_to_arrow(pa, name, frame[name], types.get(name))
+               for name in frame.columns]
+    return pa.Table.from_arrays(columns, names=[str(c) for c in frame.columns])
+
+
+@contextmanager
+def replace_dir(path):
+    """
+    Yields an empty directory next to path to write into. When the block
+    finishes it takes path's place, so path only ever holds a complete set
+    of files. If the block raises path is left as it was.
+    """
+    parent, name = os.path.split(path.rstrip('/'))
+    tmp_dir = os.path.join(parent, ".{0}.tmp-{1}".format(name, os.getpid()))
+    old_dir = os.path.join(parent, ".{0}.old-{1}".format(name, os.getpid()))
+    for leftover in (tmp_dir, old_dir):
+        shutil.rmtree(leftover, ignore_errors=True)
+    os.mkdir(tmp_dir)
+
+    try:
+        yield tmp_dir
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # A directory can't be renamed over another, move the old one aside
+    # first. Only a crash between the two renames leaves path missing.
+    if os.path.exists(path):
+        os.rename(path, old_dir)
+    os.rename(tmp_dir, path)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def write_arrow(arrow_table, base, fmt):
+    """
+    Save a pyarrow Table as a compressed parquet or arrow file.
+    """
+    pa = import_pyarrow()
+    path = file_path(base, fmt)
+    if fmt == 'parquet':
+        pa.parquet.write_table(arrow_table, path, compression=COMPRESSION)
+    elif fmt == 'arrow':
+        pa.feather.write_feather(arrow_table, path, compression=COMPRESSION)
+    else:
+        raise ValueError("Unknown columnar format: {0}".format(fmt))
+    return path
+
+
+def write_frame(frame, base, fmt='csv', table=None):
+    """
+    Save a DataFrame to base plus the extension for fmt.
+    """
+    if fmt == 'csv':
+        path = file_path(base, fmt)
+        frame.to_csv(path, encoding='utf-8')
+        return path
+    return write_arrow(frame_to_arrow(frame, table), base, fmt)
+
+
+def read_frame(base, fmt='csv'):
+    """
+    Load a table written by write_frame.
+    """
+    path = file_path(base, fmt)
+    if fmt == 'csv':
+        return pd.read_csv(path, index_col=0)
+    if fmt == 'parquet':
+        return pd.read_parquet(path)
+    if fmt == 'arrow':
+        return pd.read_feather(path)
+    raise ValueError("Unknown output format: {0}".format(fmt))
+
+
+def iter_frames(base, fmt='csv', chunk_rows=CHUNK_ROWS, index_col=0):
+    """
+    Load a table written by write_frame as DataFrames of at most chunk_rows
+    rows each, so only one chunk is in memory at a time.
+    """
+    path = file_path(base, fmt)
+    if fmt == 'csv':
+        for chunk in pd.read_csv(path, index_col=index_col,
+                                 chunksize=chunk_rows):
+            yield chunk
+        return
+
+    pa = import_pyarrow()
+    if fmt == 'parquet':
+        batches = pa.parquet.ParquetFile(path).iter_batches(
+            batch_size=chunk_rows)
+    elif fmt == 'arrow':
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        batches = (reader.get_batch(i)
+                   for i in range(reader.num_record_batches))
+    else:
+        raise ValueError("Unknown output format: {0}".format(fmt))
+
+    for batch in batches:
+        for start in range(0, max(batch.num_rows, 1), chunk_rows):
+            yield batch.slice(start, chunk_rows).to_pandas()
+
+
+class ChunkWriter(object):
+    """
+    Write one table file a chunk at a time, DataFrames or pyarrow Tables.
+    csv chunks are appended below a single header. The columnar formats
+    keep the schema of the first chunk, and dictionary encoded columns get
+    one dictionary that grows with each chunk, arrow files can't replace a
+    dictionary part way through.
+    """
+
+    def __init__(self, base, fmt='csv', table=None):
+        self.path = file_path(base, fmt)
+        self.fmt = fmt
+        self.table = table
+        self.writer = None
+        self.schema = None
+        self.dictionaries = {}
+        self.started = False
+
+    def write_frame(self, frame):
+        if self.fmt == 'csv':
+            frame.to_csv(self.path, mode='a' if self.started else 'w',
+                         header=not self.started, encoding='utf-8')
+            self.started = True
+        else:
+            self.write_arrow(frame_to_arrow(frame, self.table))
+
+    def write_arrow(self, arrow_table):
+        pa = import_pyarrow()
+        if self.writer is None:
+            self.schema = arrow_table.schema
+            if self.fmt == 'parquet':
+                self.writer = pa.parquet.ParquetWriter(
+                    self.path, self.schema, compression=COMPRESSION)
+            elif self.fmt == 'arrow':
+                self.writer = pa.ipc.new_file(
+                    self.path, self.schema, options=pa.ipc.IpcWriteOptions(
+                        compression=COMPRESSION,
+                        emit_dictionary_deltas=True))
+            else:
+                raise ValueError(
+                    "Unknown columnar format: {0}".format(self.fmt))
+        self.writer.write_table(self.unify_dictionaries(pa, arrow_table))
+        self.started = True
+
+    def unify_dictionaries(self, pa, arrow_table):
+        """
+        Cast arrow_table to the file's schema, re-encoding dictionary
+        columns against the values seen in earlier chunks.
+        """
+        columns = []
+        for field in self.schema:
+            column = arrow_table.column(field.name)
+            if pa.types.is_dictionary(field.type):
+                column = self.unify_dictionary(pa, field, column)
+            elif column.type != field.type:
+                column = column.cast(field.type)
+            columns.append(column)
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    def unify_dictionary(self, pa, field, column):
+        seen = self.dictionaries.setdefault(field.name, {})
+        if not pa.types.is_dictionary(column.type):
+            column = column.dictionary_encode()
+        chunks = []
+        for chunk in column.chunks:
+            local = chunk.dictionary.to_pylist()
+            for value in local:
+                if value not in seen:
+                    seen[value] = len(seen)
+            remap = pa.array([seen[value] for value in local],
+                             type=field.type.index_type)
+            indices = remap.take(chunk.indices)
+            chunks.append(pa.DictionaryArray.from_arrays(
+                indices, pa.array(list(seen), type=field.type.value_type)))
+        return pa.chunked_array(chunks, type=field.type)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def table_files(dest, filename, fmt):
+    """
+    Returns the per congress files of a table under dest in congress order.
+    """
+    def congress_order(path):
+        congress = os.path.basename(os.path.dirname(path))
+        return int(congress) if congress.isdigit() else 0
+
+    base = os.path.splitext(filename)[0]
+    paths = glob.glob("{0}/*/{1}".format(dest, file_path(base, fmt)))
+    return sorted(paths, key=congress_order)
+
+
+def read_table(dest, filename, fmt):
+    """
+    Read the parquet or arrow files of one table for every congress under
+    dest as a single pyarrow Table. Only the files are scanned, there is no
+    parsing involved.
+    """
+    import_pyarrow()
+    import pyarrow.dataset as ds
+
+    paths = table_files(dest, filename, fmt)
+    dataset = ds.dataset(paths, format='feather' if fmt == 'arrow' else fmt)
+    return dataset.to_table()
+
+
+def iter_table(dest, filename, fmt, chunk_rows=CHUNK_ROWS):
+    """
+    Like read_table, but yields the rows as pyarrow Tables of at most
+    chunk_rows rows in congress order instead of loading them all.
+    """
+    pa = import_pyarrow()
+    import pyarrow.dataset as ds
+
+    paths = table_files(dest, filename, fmt)
+    dataset = ds.dataset(paths, format='feather' if fmt == 'arrow' else fmt)
+    for batch in dataset.to_batches(batch_size=chunk_rows):
+        yield pa.Table.from_batches([batch])
@@ -0,0 +1,330 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Look rows up in the csv files save_congress wrote without reading whole
+files. Each indexed table of a congress gets an index file next to it
+mapping bill_id, bioguide_id or vote_id to the byte ranges of the matching
+rows, along with the range of dates in the file. A lookup seeks straight to
+those rows and only parses them.
+
+Indexes are built the first time they are needed, or all at once with
+build_indexes, and rebuilt whenever their csv file changes.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from govtrack2csv.output import table_files
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# The columns we index for each table and the column holding its dates.
+INDEX_COLUMNS = {
+    'legislation.csv': ['bill_id'],
+    'sponsor_map.csv': ['bill_id', 'thomas_id'],
+    'cosponsor_map.csv': ['bill_id', 'thomas_id'],
+    'events.csv': ['bill_id'],
+    'committees_map.csv': ['bill_id'],
+    'subjects_map.csv': ['bill_id'],
+    'votes.csv': ['vote_id', 'bill_id'],
+    'votes_people.csv': ['bioguide_id', 'vote_id'],
+}
+DATE_COLUMNS = {
+    'legislation.csv': 'introduced_at',
+    'events.csv': 'acted_at',
+    'votes.csv': 'date',
+    'votes_people.csv': 'date',
+}
+
+# bill and vote ids end in their congress, hr1234-114 and h123-114.2015.
+ID_CONGRESS = re.compile(r'-(\d+)(?:\.\w+)?$')
+
+
+def index_path(csv_path):
+    directory, filename = os.path.split(csv_path)
+    return "{0}/.{1}.index.json".format(directory,
+                                        os.path.splitext(filename)[0])
+
+
+def iter_records(f):
+    """
+    Yields (row, offset, length) for each csv record of the binary file f,
+    header included. Quoted fields may span lines.
+    """
+    starts = []
+    position = [0]
+
+    def lines():
+        for line in f:
+            starts.append(position[0])
+            position[0] += len(line)
+            yield line.decode('utf-8')
+
+    consumed = 0
+    for row in csv.reader(lines()):
+        offset = starts[consumed]
+        consumed = len(starts)
+        yield row, offset, position[0] - offset
+
+
+class TableIndex(object):
+    """
+    Byte ranges of the rows of one csv file by the values of its indexed
+    columns.
+    """
+
+    def __init__(self, path, size=None, mtime=None, header=None,
+                 columns=None, dates=None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.header = header
+        self.columns = columns if columns is not None else {}
+        self.dates = dates
+
+    @classmethod
+    def build(cls, path, filename):
+        """
+        Scan a csv file once, recording where the rows of every value of the
+        indexed columns are.
+        """
+        stat = os.stat(path)
+        index = cls(path, stat.st_size, stat.st_mtime_ns)
+        wanted = INDEX_COLUMNS[filename]
+        date_column = DATE_COLUMNS.get(filename)
+        low = high = None
+
+        with open(path, 'rb') as f:
+            records = iter_records(f)
+            try:
+                header, _, length = next(records)
+            except StopIteration:
+                return index
+            index.header = length
+            positions = [(name, header.index(name)) for name in wanted
+                         if name in header]
+            date_at = header.index(date_column) if date_column in header \
+                else None
+
+            for name, _ in positions:
+                index.columns[name] = {}
+            for row, offset, length in records:
+                for name, at in positions:
+                    if at < len(row) and row[at]:
+                        index.columns[name].setdefault(row[at], []).append(
+                            [offset, length])
+                if date_at is not None and date_at < len(row) and \
+                        row[date_at]:
+                    date = row[date_at]
+                    low = date if low is None or date < low else low
+                    high = date if high is None or date > high else high
+
+        index.dates = [low, high] if low is not None else None
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns the saved index of a csv file, or None if there is none or it
+        is out of date.
+        """
+        try:
+            with open(index_path(path), 'r') as f:
+                data = json.load(f)
+            stat = os.stat(path)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get('version') != INDEX_VERSION or \
+                data['size'] != stat.st_size or \
+                data['mtime'] != stat.st_mtime_ns:
+            return None
+        return cls(path, data['size'], data['mtime'], data['header'],
+                   data['columns'], data['dates'])
+
+    def save(self):
+        out = index_path(self.path)
+        tmp_path = "{0}.tmp".format(out)
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'size': self.size,
+                       'mtime': self.mtime, 'header': self.header,
+                       'columns': self.columns, 'dates': self.dates}, f)
+        os.replace(tmp_path, out)
+
+    def overlaps(self, start=None, end=None):
+        """
+        Could the file hold rows dated between start and end? Dates are iso
+        strings, so comparing them as strings works.
+        """
+        if self.dates is None or (start is None and end is None):
+            return True
+        low, high = self.dates
+        return (start is None or high >= start) and \
+            (end is None or low[:len(end)] <= end)
+
+    def read(self, column, value):
+        """
+        Returns the rows where column equals value as csv text, header
+        first. Rows next to each other in the file are read together.
+        """
+        ranges = self.columns.get(column, {}).get(value)
+        if not ranges or self.header is None:
+            return None
+
+        chunks = []
+        with open(self.path, 'rb') as f:
+            chunks.append(f.read(self.header))
+            start, end = ranges[0][0], ranges[0][0]
+            for offset, length in ranges:
+                if offset != end:
+                    f.seek(start)
+                    chunks.append(f.read(end - start))
+                    start = offset
+                end = offset + length
+            f.seek(start)
+            chunks.append(f.read(end - start))
+        return b''.join(chunks)
+
+
+class OutputIndex(object):
+    """
+    Queries over the csv output of convert_congress in dest. Table indexes
+    are loaded, or built and saved, on first use and kept in memory.
+    """
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.indexes = {}
+
+    def congresses(self):
+        return sorted((c for c in os.listdir(self.dest) if c.isdigit()),
+                      key=int)
+
+    def table_index(self, congress, filename):
+        path = "{0}/{1}/{2}".format(self.dest, congress, filename)
+        index = self.indexes.get(path)
+        if index is not None:
+            stat = os.stat(path)
+            if index.size == stat.st_size and index.mtime == stat.st_mtime_ns:
+                return index
+
+        index = TableIndex.load(path)
+        if index is None:
+            logger.info("Indexing %s", path)
+            index = TableIndex.build(path, filename)
+            index.save()
+        self.indexes[path] = index
+        return index
+
+    def lookup(self, filename, column, value, congresses=None, start=None,
+               end=None):
+        """
+        Returns the rows of filename where column equals value as a
+        DataFrame, from every congress or just the ones given, optionally
+        only the rows dated between start and end inclusive.
+        """
+        if congresses is None:
+            congresses = self.congresses()
+
+        frames = []
+        for congress in congresses:
+            congress = str(congress)
+            if not os.path.exists("{0}/{1}/{2}".format(self.dest, congress,
+                                                       filename)):
+                continue
+            index = self.table_index(congress, filename)
+            if not index.overlaps(start, end):
+                continue
+            text = index.read(column, value)
+            if text:
+                frames.append(pd.read_csv(io.BytesIO(text), index_col=0))
+
+        if not frames:
+            return pd.DataFrame()
+        rows = pd.concat(frames)
+
+        date_column = DATE_COLUMNS.get(filename)
+        if date_column and (start or end):
+            # Masks rather than Series, the index repeats across congresses.
+            dates = rows[date_column].astype(str)
+            keep = np.ones(len(rows), dtype=bool)
+            if start:
+                keep &= (dates >= start).values
+            if end:
+                keep &= (dates.str.slice(0, len(end)) <= end).values
+            rows = rows[keep]
+        return rows
+
+    def id_congresses(self, some_id):
+        match = ID_CONGRESS.search(some_id)
+        return [match.group(1)] if match else None
+
+    def legislation(self, bill_id):
+        return self.lookup('legislation.csv', 'bill_id', bill_id,
+                           self.id_congresses(bill_id))
+
+    def events_for_bill(self, bill_id):
+        return self.lookup('events.csv', 'bill_id', bill_id,
+                           self.id_congresses(bill_id))
+
+    def votes_for_bill(self, bill_id):
+        return self.lookup('votes.csv', 'bill_id', bill_id,
+                           self.id_congresses(bill_id))
+
+    def vote(self, vote_id):
+        return self.lookup('votes.csv', 'vote_id', vote_id,
+                           self.id_congresses(vote_id))
+
+    def tallies_for_vote(self, vote_id):
+        return self.lookup('votes_people.csv', 'vote_id', vote_id,
+                           self.id_congresses(vote_id))
+
+    def votes_for_legislator(self, bioguide_id, congresses=None, start=None,
+                             end=None):
+        """
+        Every roll call tally of a member, optionally limited to some
+        congresses and to dates between start and end ('2015-01-01', or
+        just '2015').
+        """
+        return self.lookup('votes_people.csv', 'bioguide_id', bioguide_id,
+                           congresses, start, end)
+
+    def bills_sponsored(self, thomas_id, congresses=None):
+        return self.lookup('sponsor_map.csv', 'thomas_id', thomas_id,
+                           congresses)
+
+
+def build_indexes(dest):
+    """
+    Build or refresh the index of every indexed table under dest.
+    """
+    output = OutputIndex(dest)
+    for filename in INDEX_COLUMNS:
+        for path in table_files(dest, filename, 'csv'):
+            output.table_index(os.path.basename(os.path.dirname(path)),
+                               filename)
+    return output
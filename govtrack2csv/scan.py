@@ -0,0 +1,106 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Find the data.json files of a congress in one pass over its directory.
+
+os.scandir hands us the file type with each name, so telling directories
+from files costs no stat calls, and text-versions directories (the bulk of
+a bills tree) are skipped without ever being listed. Directories are
+visited in name order so every run finds the files in the same order.
+
+A scan with_stat also records each file's size and mtime. convert_congress
+makes that scan once per congress to estimate its cost and keeps it as the
+congress's file manifest, the 'entries' of its congress dict, which
+batching and the workers list documents from (see
+govtrack2csv.congress_entries) instead of walking the tree again.
+"""
+
+import os
+
+from collections import namedtuple
+from operator import attrgetter
+
+
+__author__ = 'vance@hackthefed.org'
+
+KINDS = ['bills', 'amendments', 'votes']
+DOCUMENT = 'data.json'
+
+# Directories we never descend into.
+EXCLUDED = frozenset(['text-versions'])
+
+# size and mtime (ns) are only filled in when the scan is asked to stat.
+ScanEntry = namedtuple('ScanEntry', ['kind', 'path', 'size', 'mtime'])
+
+
+def scan_tree(top, kind, with_stat=False):
+    """
+    Yields a ScanEntry for every data.json under top, depth first, a
+    directory's own data.json before those of its subdirectories.
+    """
+    stack = [top]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=attrgetter('name'))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in EXCLUDED:
+                    subdirs.append(entry.path)
+            elif entry.name == DOCUMENT:
+                if with_stat:
+                    stat = entry.stat()
+                    yield ScanEntry(kind, entry.path, stat.st_size,
+                                    stat.st_mtime_ns)
+                else:
+                    yield ScanEntry(kind, entry.path, None, None)
+        stack.extend(reversed(subdirs))
+
+
+def scan_order(path):
+    """
+    Sort key that puts data.json paths in the order scan_tree finds them,
+    directory by directory in name order, a directory's own data.json
+    before those of its subdirectories.
+    """
+    return tuple(path.replace(os.sep, '/').split('/')[:-1])
+
+
+def scan_congress(congress_dir, kinds=KINDS, with_stat=False):
+    """
+    Returns a ScanEntry for every data.json of the given kinds under a
+    congress directory, grouped by kind in the order of kinds.
+    """
+    entries = []
+    for kind in kinds:
+        entries.extend(scan_tree(os.path.join(congress_dir, kind), kind,
+                                 with_stat))
+    return entries
+
+
+def by_kind(entries):
+    """
+    Returns a dict of kind to the paths of entries of that kind.
+    """
+    paths = dict((kind, []) for kind in KINDS)
+    for entry in entries:
+        paths.setdefault(entry.kind, []).append(entry.path)
+    return paths
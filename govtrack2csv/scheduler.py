@@ -0,0 +1,441 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Split the data.json files of every congress into batches and fan them out
+over a single process pool. Mapping one job per congress leaves all but one
+core idle while the big modern congresses finish, batching lets every
+congress use every core.
+
+The documents of a compressed tar can only be read front to back, its
+batches are cut from a single stream over the archive as it is read and
+carry their documents' content, with only a few of them in flight at once.
+
+Both ways of running record each congress's progress in a Checkpoint when
+given one. A congress that fails is retried on its own, with a growing
+delay, instead of taking the rest of the run down with it.
+"""
+
+import math
+import queue
+import time
+import traceback
+
+from collections import defaultdict
+
+from govtrack2csv import convert_congress
+from govtrack2csv import list_documents
+from govtrack2csv import logger
+from govtrack2csv import process_document
+from govtrack2csv import read_document
+from govtrack2csv import save_congress_rows
+from govtrack2csv import stats
+from govtrack2csv.checkpoint import DONE, FAILED, RUNNING
+from govtrack2csv.cost import longest_first
+from govtrack2csv.scan import KINDS, scan_order
+from govtrack2csv.source import congress_source
+from govtrack2csv.tally import TallyColumns
+
+
+__author__ = 'vance@hackthefed.org'
+
+BATCH_SIZE = 500
+
+# Batches streamed from a compressed archive that may be waiting for, or in,
+# a worker at once. Each holds the content of its documents.
+IN_FLIGHT = 16
+
+# A failed congress is tried again RETRIES times, waiting BACKOFF seconds
+# before the first retry and twice as long before each one after that.
+RETRIES = 2
+BACKOFF = 5.0
+
+
+def largest_first(congresses, estimates=None):
+    """
+    Order congresses so the biggest start first and the small ones fill in
+    around them at the end, by their cost.Estimate when we have them.
+    Otherwise by number, each congress has more documents than the one
+    before it so the newest are the biggest.
+    """
+    if estimates:
+        return longest_first(congresses, estimates)
+
+    def key(congress):
+        name = congress['congress']
+        return (-int(name), name) if name.isdigit() else (1, name)
+    return sorted(congresses, key=key)
+
+
+def timed(job, congress):
+    """
+    Run job(congress) in a worker, returning the seconds it took along with
+    its result.
+    """
+    started = time.perf_counter()
+    result = job(congress)
+    return time.perf_counter() - started, result
+
+
+def describe_error(error):
+    return "".join(traceback.format_exception_only(type(error),
+                                                   error)).strip()
+
+
+def batch_congress(congress):
+    """
+    The congress dict sent along with each of its batches, without the
+    entries of its scan, a batch only needs its own documents.
+    """
+    return dict((k, v) for k, v in congress.items() if k != 'entries')
+
+
+def make_batches(congresses, batch_size=BATCH_SIZE):
+    """
+    Returns a list of batches, each a dict holding the congress it belongs
+    to, its position within that congress and up to batch_size
+    (kind, file_path) documents.
+    """
+    batches = []
+    for congress in congresses:
+        documents = list_documents(congress)
+        job = batch_congress(congress)
+        for i in range(0, len(documents), batch_size):
+            batches.append({'congress': job,
+                            'index': i // batch_size,
+                            'documents': documents[i:i + batch_size]})
+    return batches
+
+
+def stream_batches(source, congresses, batch_size=BATCH_SIZE):
+    """
+    Yields the batches of congresses from one pass over a compressed
+    archive, like make_batches but with each document's content read along
+    with it as (kind, file_path, content). A congress's last batch is
+    yielded as soon as its last document is read.
+    """
+    by_name = dict((c['congress'], batch_congress(c)) for c in congresses)
+    expected = dict((name, len(source.scan(name))) for name in by_name)
+    buffers = defaultdict(list)
+    read = defaultdict(int)
+    index = defaultdict(int)
+
+    def cut(name):
+        batch = {'congress': by_name[name], 'index': index[name],
+                 'documents': buffers.pop(name), 'streamed': True}
+        index[name] += 1
+        return batch
+
+    for name, kind, member, content in source.stream_members(set(by_name)):
+        buffers[name].append((kind, member, content))
+        read[name] += 1
+        if len(buffers[name]) == batch_size or read[name] == expected[name]:
+            yield cut(name)
+    for name in sorted(buffers):
+        yield cut(name)
+
+
+def count_batches(source, congresses, batch_size=BATCH_SIZE):
+    """
+    How many batches stream_batches will cut for each congress.
+    """
+    return dict((c['congress'], int(math.ceil(
+        len(source.scan(c['congress'])) / float(batch_size))))
+        for c in congresses)
+
+
+def bounded_imap(pool, func, jobs, in_flight=IN_FLIGHT):
+    """
+    pool.imap_unordered that takes the next job from jobs only once fewer
+    than in_flight are submitted, imap_unordered would read all of a stream
+    into its queue up front.
+    """
+    finished = queue.Queue()
+    jobs = iter(jobs)
+    running = 0
+    exhausted = False
+    while True:
+        while not exhausted and running < in_flight:
+            try:
+                job = next(jobs)
+            except StopIteration:
+                exhausted = True
+                break
+            pool.apply_async(func, (job,), callback=finished.put,
+                             error_callback=finished.put)
+            running += 1
+        if not running:
+            return
+        result = finished.get()
+        running -= 1
+        if isinstance(result, BaseException):
+            raise result
+        yield result
+
+
+def document_order(kind, file_path):
+    """
+    Sort key for the documents of a congress, the order list_documents
+    gives them in.
+    """
+    return KINDS.index(kind), scan_order(file_path)
+
+
+def process_batch(batch):
+    """
+    Extract every document in a batch, read from its congress's source unless
+    the batch carries their content. Runs in the pool workers.
+    :return tuple: congress name, batch index, a dict of tables, or None if
+    the batch failed, the spans of a streamed batch's documents, the batch's
+    stage stats if the congress asked for them, the error if it failed and
+    the seconds it took
+    """
+    started = time.perf_counter()
+    congress = batch['congress']
+    if congress.get('stats'):
+        stats.start(congress['congress'])
+
+    data = defaultdict(list)
+    tallies = TallyColumns()
+    # A streamed batch's documents come in archive order. Note where each
+    # document's rows went so merge_batches can put them in path order.
+    spans = [] if batch.get('streamed') else None
+    try:
+        source = congress_source(congress)
+        for document in batch['documents']:
+            kind, file_path = document[:2]
+            if len(document) > 2:
+                content = document[2]
+            else:
+                content = read_document(file_path, source)
+            tallied = len(tallies)
+            counts = {}
+            for table, rows in process_document(kind, content,
+                                                tallies).items():
+                data[table].extend(rows)
+                counts[table] = len(rows)
+            if spans is not None:
+                counts['votes_people'] = len(tallies) - tallied
+                spans.append((document_order(kind, file_path), counts))
+    except Exception as e:
+        logger.exception("Batch %s of Congress %s failed", batch['index'],
+                         congress['congress'])
+        return congress['congress'], batch['index'], None, None, \
+            stats.stop(), describe_error(e), time.perf_counter() - started
+    data['votes_people'] = tallies
+
+    return congress['congress'], batch['index'], data, spans, stats.stop(), \
+        None, time.perf_counter() - started
+
+
+def merge_batches(results, spans=None):
+    """
+    Combine the tables of a congress's batches in batch order so the csv
+    files come out in the same order every run. Given the spans of streamed
+    batches, (document order, rows per table) for every document of each
+    batch, the rows are put back in document order instead, the order a
+    directory or zip of the same snapshot gives.
+    """
+    data = defaultdict(list)
+    data['votes_people'] = TallyColumns()
+    if not spans:
+        for index in sorted(results):
+            for table, rows in results[index].items():
+                data[table].extend(rows)
+        return data
+
+    pieces = []
+    for index in sorted(results):
+        offsets = defaultdict(int)
+        for order, counts in spans[index]:
+            ranges = {}
+            for table, count in counts.items():
+                ranges[table] = (offsets[table], offsets[table] + count)
+                offsets[table] += count
+            pieces.append((order, index, ranges))
+    pieces.sort(key=lambda piece: piece[:2])
+
+    for order, index, ranges in pieces:
+        for table, (start, stop) in ranges.items():
+            if stop > start:
+                data[table].extend(results[index][table][start:stop])
+    return data
+
+
+def convert_congresses(congresses, pool, batch_size=BATCH_SIZE,
+                       checkpoint=None, estimates=None, timings=None):
+    """
+    Convert a list of congress dicts using the workers in pool. Each congress
+    is built and saved in this process as soon as its last batch comes back,
+    while the pool keeps working through the remaining batches. A congress
+    with a failed batch is not saved and is marked failed in checkpoint,
+    run_congresses can retry it whole. The batches of the costliest
+    congresses, by estimates, go first, and the seconds spent on each
+    congress are added up in timings. Congresses in a compressed archive are
+    batched in archive order as it is streamed.
+    :return list: the stage stats dicts of the batches and of the saves when
+    the congresses asked for stats
+    """
+    collected = []
+
+    def mark(name, state, error=None):
+        if checkpoint is not None:
+            checkpoint.mark(name, state, error)
+
+    def save(congress, rows):
+        if congress.get('stats'):
+            stats.start(congress['congress'])
+        started = time.perf_counter()
+        try:
+            save_congress_rows(congress, rows)
+        except Exception as e:
+            logger.exception("Saving Congress %s failed",
+                             congress['congress'])
+            mark(congress['congress'], FAILED, describe_error(e))
+        else:
+            mark(congress['congress'], DONE)
+        finally:
+            collected.append(stats.stop())
+            if timings is not None:
+                timings[congress['congress']] = timings.get(
+                    congress['congress'], 0) + time.perf_counter() - started
+
+    congresses = largest_first(congresses, estimates)
+    for congress in congresses:
+        mark(congress['congress'], RUNNING)
+
+    pending = defaultdict(int)
+    source = congress_source(congresses[0]) if congresses else None
+    if source is not None and not source.random_access:
+        pending.update(count_batches(source, congresses, batch_size))
+        batches = stream_batches(source, congresses, batch_size)
+        processed = bounded_imap(pool, process_batch, batches)
+    else:
+        batches = make_batches(congresses, batch_size)
+        for batch in batches:
+            pending[batch['congress']['congress']] += 1
+        processed = pool.imap_unordered(process_batch, batches, chunksize=1)
+    logger.info("Scheduling %s batches for %s congresses",
+                sum(pending.values()), len(congresses))
+
+    by_name = dict((c['congress'], c) for c in congresses)
+    results = defaultdict(dict)
+    spans = defaultdict(dict)
+    failed = {}
+
+    # Congresses without any documents still get their placeholder csvs.
+    for name, congress in by_name.items():
+        if not pending[name]:
+            save(congress, defaultdict(list))
+
+    for name, index, data, batch_spans, batch_stats, error, seconds in \
+            processed:
+        collected.append(batch_stats)
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + seconds
+        if error is not None:
+            failed.setdefault(name, error)
+        else:
+            results[name][index] = data
+            if batch_spans is not None:
+                spans[name][index] = batch_spans
+        pending[name] -= 1
+        if pending[name] == 0:
+            if name in failed:
+                results.pop(name, None)
+                spans.pop(name, None)
+                mark(name, FAILED, failed[name])
+            else:
+                logger.info("Saving Congress %s", name)
+                save(by_name[name], merge_batches(results.pop(name),
+                                                  spans.pop(name, None)))
+
+    return [c for c in collected if c]
+
+
+def run_congresses(congresses, pool, checkpoint=None, retries=RETRIES,
+                   backoff=BACKOFF, job=convert_congress, estimates=None,
+                   timings=None):
+    """
+    Run job, convert_congress, for every congress dict on pool, largest
+    first, one congress per task. A congress that raises is retried up to
+    retries times, the n-th retry waiting backoff * 2 ** (n - 1) seconds,
+    while the others carry on. The seconds each successful job took are
+    recorded in timings.
+    :return tuple: the stats dicts the jobs returned and the names of the
+    congresses that still failed
+    """
+    collected = []
+    failed = []
+    finished = queue.Queue()
+    # (time it may start, congress) of every congress not yet submitted.
+    waiting = [(0, c) for c in largest_first(congresses, estimates)]
+    running = 0
+    tried = defaultdict(int)
+    while waiting or running:
+        now = time.monotonic()
+        for ready, congress in [w for w in waiting if w[0] <= now]:
+            waiting.remove((ready, congress))
+            name = congress['congress']
+            tried[name] += 1
+            if checkpoint is not None:
+                checkpoint.mark(name, RUNNING)
+            pool.apply_async(
+                timed, (job, congress),
+                callback=lambda result, c=congress: finished.put(
+                    (c, result, None)),
+                error_callback=lambda error, c=congress: finished.put(
+                    (c, None, error)))
+            running += 1
+
+        if not running:
+            time.sleep(max(0, min(w[0] for w in waiting) - now))
+            continue
+
+        timeout = None
+        if waiting:
+            timeout = max(0, min(w[0] for w in waiting) - now)
+        try:
+            congress, result, error = finished.get(timeout=timeout)
+        except queue.Empty:
+            continue
+        running -= 1
+
+        name = congress['congress']
+        if error is None:
+            seconds, result = result
+            if result:
+                collected.append(result)
+            if timings is not None:
+                timings[name] = seconds
+            if checkpoint is not None:
+                checkpoint.mark(name, DONE)
+            continue
+
+        message = describe_error(error)
+        if checkpoint is not None:
+            checkpoint.mark(name, FAILED, message)
+        attempt = tried[name]
+        if attempt <= retries:
+            delay = backoff * 2 ** (attempt - 1)
+            logger.warning("Congress %s failed (%s), retrying in %.0fs",
+                           name, message, delay)
+            waiting.append((time.monotonic() + delay, congress))
+        else:
+            logger.error("Congress %s still failed after %s retries, giving "
+                         "up: %s", name, retries, message)
+            failed.append(name)
+
+    return collected, sorted(failed)
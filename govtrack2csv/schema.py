@@ -0,0 +1,194 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+The tables we build for each congress, defined once. Each table has a row
+type, a namedtuple the extract functions fill in, so the columns of a row
+and of its DataFrame can't drift apart, and the types of the columns that
+are not plain strings.
+"""
+
+import logging
+
+from collections import namedtuple
+
+import pandas as pd
+
+from govtrack2csv.util import datestrings_to_datetimes
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+Legislation = namedtuple('Legislation', [
+    'congress', 'bill_id', 'bill_type', 'introduced_at', 'number',
+    'official_title', 'popular_title', 'short_title', 'status', 'status_at',
+    'top_subject', 'updated_at'])
+
+Sponsor = namedtuple('Sponsor', [
+    'type', 'thomas_id', 'bill_id', 'district', 'state'])
+
+Cosponsor = namedtuple('Cosponsor', [
+    'thomas_id', 'bill_id', 'district', 'state'])
+
+Event = namedtuple('Event', [
+    'bill_id', 'acted_at', 'how', 'result', 'roll', 'status', 'suspension',
+    'text', 'type', 'vote_type', 'where', 'calander', 'number', 'under',
+    'committee', 'committees'])
+
+CommitteeRef = namedtuple('CommitteeRef', [
+    'type', 'name', 'committee_id', 'bill_id'])
+
+Subject = namedtuple('Subject', ['bill_id', 'bill_type', 'subject'])
+
+Vote = namedtuple('Vote', [
+    'amendment_id', 'bill_id', 'category', 'congress', 'chamber', 'date',
+    'number', 'requires', 'result', 'result_text', 'session', 'type',
+    'updated_at', 'vote_id', 'yes', 'no', 'not_voting', 'present'])
+
+VoteTally = namedtuple('VoteTally', [
+    'vote', 'vote_id', 'bioguide_id', 'party', 'state', 'date'])
+
+Amendment = namedtuple('Amendment', [
+    'amendment_id', 'amendment_type', 'amends_amendment', 'amends_bill',
+    'amends_treaty', 'chamber', 'congress', 'description', 'introduced',
+    'number', 'proposed', 'purpose', 'sponsor_id', 'committee_id',
+    'sponsor_type', 'status', 'updated'])
+
+Table = namedtuple('Table', ['name', 'filename', 'row', 'types'])
+
+# Every table, the file it is saved to, its row type and the columns that
+# are not strings. Integers are nullable, a missing value stays missing.
+# category columns are strings repeated so often they are worth keeping as
+# pandas categoricals in memory, they are written as plain strings.
+SCHEMA = [
+    Table('legislation', 'legislation.csv', Legislation,
+          {'congress': 'int16', 'number': 'int32',
+           'introduced_at': 'datetime', 'status_at': 'datetime',
+           'updated_at': 'datetime'}),
+    Table('sponsors', 'sponsor_map.csv', Sponsor, {}),
+    Table('cosponsors', 'cosponsor_map.csv', Cosponsor,
+          {'bill_id': 'category'}),
+    Table('events', 'events.csv', Event,
+          {'acted_at': 'datetime', 'suspension': 'bool',
+           'committees': 'list', 'bill_id': 'category'}),
+    Table('committees', 'committees_map.csv', CommitteeRef, {}),
+    Table('subjects', 'subjects_map.csv', Subject,
+          {'bill_id': 'category', 'subject': 'category'}),
+    Table('votes', 'votes.csv', Vote,
+          {'congress': 'int16', 'number': 'int32', 'yes': 'int16',
+           'no': 'int16', 'not_voting': 'int16', 'present': 'int16',
+           'date': 'datetime', 'updated_at': 'datetime'}),
+    Table('votes_people', 'votes_people.csv', VoteTally,
+          {'vote_id': 'category', 'bioguide_id': 'category',
+           'date': 'datetime'}),
+    Table('amendments', 'amendments.csv', Amendment,
+          {'congress': 'int16', 'number': 'int32',
+           'introduced': 'datetime', 'proposed': 'datetime',
+           'updated': 'datetime'}),
+]
+
+# String columns with few distinct values in any table, categoricals in
+# memory and stored dictionary encoded by the columnar formats.
+CATEGORIES = {'chamber', 'party', 'state', 'vote', 'bill_type', 'category',
+              'type', 'status', 'requires', 'result', 'session',
+              'amendment_type', 'sponsor_type', 'vote_type', 'where', 'how',
+              'gender'}
+
+TABLES = [(t.name, t.filename, list(t.row._fields)) for t in SCHEMA]
+COLUMNS = dict((t.name, list(t.row._fields)) for t in SCHEMA)
+COLUMN_TYPES = dict((t.name, t.types) for t in SCHEMA if t.types)
+
+PANDAS_TYPES = {'int16': 'Int16', 'int32': 'Int32', 'bool': 'boolean'}
+
+
+def date_columns(table):
+    """
+    The names of a table's datetime columns.
+    """
+    return [name for name, kind in COLUMN_TYPES.get(table, {}).items()
+            if kind == 'datetime']
+
+
+def empty_row(table):
+    """
+    The all empty row we save in place of a table with no rows.
+    """
+    return [None] * len(COLUMNS[table])
+
+
+def typed_column(values, kind):
+    dtype = PANDAS_TYPES.get(kind)
+    if dtype is None:
+        return pd.Series(values, dtype=object)
+    if kind == 'bool':
+        try:
+            return pd.Series(values, dtype=dtype)
+        except (TypeError, ValueError):
+            return pd.Series(values, dtype=object)
+    return pd.to_numeric(pd.Series(values, dtype=object),
+                         errors='coerce').astype(dtype)
+
+
+def typed_frame(table, rows):
+    """
+    Build the DataFrame of a table from its rows, row type tuples or plain
+    lists in column order, with the column types from SCHEMA. Empty rows are
+    dropped and a table without rows gets empty_row.
+    """
+    columns = COLUMNS[table]
+    types = COLUMN_TYPES.get(table, {})
+    rows = [r for r in rows if r]
+    if not rows:
+        rows = [empty_row(table)]
+
+    data = dict((name, typed_column(values, types.get(name)))
+                for name, values in zip(columns, zip(*rows)))
+    return pd.DataFrame(data, columns=columns)
+
+
+def normalize_column(table, name, column, kind):
+    if kind == 'datetime':
+        parsed = datestrings_to_datetimes(column)
+        bad = parsed.isnull() & column.notnull()
+        if bad.any():
+            # Rather keep the strings than lose dates we can't read.
+            logger.warning("%s.%s: %s values are not dates, e.g. %s", table,
+                           name, bad.sum(), column[bad].iloc[0])
+            return column
+        return parsed
+    if (kind == 'category' or name in CATEGORIES) and \
+            pd.api.types.is_string_dtype(column.dtype):
+        # Lists and other unhashable values stay as they are.
+        try:
+            return column.astype('category')
+        except TypeError:
+            return column
+    return column
+
+
+def normalize_frame(table, frame):
+    """
+    Convert the date columns of a table's DataFrame to datetime64 and its
+    repetitive string columns to categoricals, a column at a time.
+    """
+    types = COLUMN_TYPES.get(table, {})
+    for name in frame.columns:
+        column = frame[name]
+        normalized = normalize_column(table, name, column, types.get(name))
+        if normalized is not column:
+            frame[name] = normalized
+    return frame
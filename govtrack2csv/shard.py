@@ -0,0 +1,286 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Split a conversion over several machines. convert_congress --shard i/N
+converts the congresses assign_shards gives shard i and, once they are all
+done, writes a shard manifest to its destination listing every file it
+wrote with its size and sha256. merge_shards checks the manifests of all N
+shards agree and that their files are intact, then assembles one output:
+the congress directories of every shard, one copy of the legislators and
+committees tables and the consolidated vote files.
+
+Every shard works the assignment out for itself from the cost estimates of
+the same snapshot, longest first onto the least loaded shard, so they agree
+without talking to each other. Each manifest records the whole assignment
+and the merge refuses shards that disagree.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from govtrack2csv.consolidate import THREADS
+from govtrack2csv.consolidate import consolidate_votes
+from govtrack2csv.output import file_path
+from govtrack2csv.output import replace_dir
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+SHARD_FILE = '.shard.json'
+SHARD_VERSION = 1
+
+# The tables every shard writes from the same sources, the merge keeps one.
+SHARED_TABLES = ['legislators', 'committees', 'subcommittees']
+
+DIGEST_BUFFER = 1024 * 1024
+
+
+def parse_shard(string):
+    """
+    Returns (index, count) for a shard given as i/N, 1 <= i <= N.
+    """
+    try:
+        index, count = [int(part) for part in string.split('/')]
+    except ValueError:
+        raise ValueError("--shard takes i/N, e.g. 1/4, not {0}".format(
+            string))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("Shard {0} is not one of 1 to {1}".format(index,
+                                                                   count))
+    return index, count
+
+
+def assign_shards(estimates, count):
+    """
+    Returns a dict of congress name to shard, 1 to count. Congresses are
+    handed out by cost.Estimate, longest first, each to the shard with the
+    least work so far, the lowest numbered one on a tie.
+    """
+    loads = [0.0] * count
+    assignment = {}
+    for estimate in sorted(estimates.values(),
+                           key=lambda e: (-e.seconds, e.congress)):
+        shard = loads.index(min(loads))
+        loads[shard] += estimate.seconds
+        assignment[estimate.congress] = shard + 1
+    return assignment
+
+
+def file_digest(path):
+    """
+    Returns [size, sha256 hex digest] of a file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(DIGEST_BUFFER)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return [size, digest.hexdigest()]
+
+
+def describe_files(directory):
+    """
+    The size and digest of every file under directory, keyed by its path
+    relative to it. Hidden files, our checkpoints and manifests, are left
+    out.
+    """
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(names):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, directory)] = file_digest(path)
+    return files
+
+
+def write_shard_manifest(dest, index, count, options, assignment):
+    """
+    Record the files shard index of count wrote to dest, call once every
+    congress assigned to it is done.
+    """
+    shared = {}
+    for table in SHARED_TABLES:
+        name = file_path(table, options.get('format', 'csv'))
+        if os.path.exists(os.path.join(dest, name)):
+            shared[name] = file_digest(os.path.join(dest, name))
+
+    congresses = dict(
+        (name, describe_files(os.path.join(dest, name)))
+        for name, shard in assignment.items() if shard == index)
+
+    path = os.path.join(dest, SHARD_FILE)
+    tmp_path = "{0}.tmp".format(path)
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': SHARD_VERSION,
+                   'shard': index,
+                   'shards': count,
+                   'options': options,
+                   'assignment': assignment,
+                   'shared': shared,
+                   'congresses': congresses}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    logger.info("Shard %s/%s manifest written to %s", index, count, path)
+
+
+def clear_shard_manifest(dest):
+    """
+    Remove the manifest of an earlier run of a shard while it converts again.
+    """
+    path = os.path.join(dest, SHARD_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def load_shard_manifest(directory):
+    path = os.path.join(directory, SHARD_FILE)
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        raise ValueError("{0} has no readable shard manifest: {1}".format(
+            directory, e))
+    if manifest.get('version') != SHARD_VERSION:
+        raise ValueError("{0} was written by another version".format(path))
+    return manifest
+
+
+def check_files(directory, files):
+    """
+    Raise ValueError unless every file in a manifest listing is there with
+    the size and digest recorded.
+    """
+    for name, recorded in sorted(files.items()):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            raise ValueError("{0} is missing".format(path))
+        if os.path.getsize(path) != recorded[0] or \
+                file_digest(path) != recorded:
+            raise ValueError("{0} changed since its shard manifest was "
+                             "written".format(path))
+
+
+def check_shards(directories):
+    """
+    Load and validate the manifests of a complete set of shards. They must
+    come from the same run options and assignment, be one each of shard 1
+    to N, and every congress must be in exactly the shard it was assigned
+    to with all its files intact.
+    :return list: the manifests in shard order, with their directories
+    under 'directory'
+    """
+    manifests = []
+    for directory in directories:
+        manifest = load_shard_manifest(directory)
+        manifest['directory'] = directory
+        manifests.append(manifest)
+    manifests.sort(key=lambda m: m['shard'])
+
+    first = manifests[0]
+    count = first['shards']
+    for manifest in manifests:
+        for key in ('shards', 'options', 'assignment'):
+            if manifest[key] != first[key]:
+                raise ValueError("Shards {0} and {1} disagree on their {2}, "
+                                 "they are not from the same run".format(
+                                     first['shard'], manifest['shard'], key))
+    found = [m['shard'] for m in manifests]
+    if found != list(range(1, count + 1)):
+        raise ValueError("Expected shards 1 to {0}, got {1}".format(
+            count, ", ".join(str(s) for s in found)))
+
+    for manifest in manifests:
+        assigned = sorted(c for c, s in first['assignment'].items()
+                          if s == manifest['shard'])
+        if sorted(manifest['congresses']) != assigned:
+            raise ValueError("Shard {0} holds congresses {1}, it was "
+                             "assigned {2}".format(
+                                 manifest['shard'],
+                                 ", ".join(sorted(manifest['congresses'])),
+                                 ", ".join(assigned)))
+        if manifest['shared'] != first['shared']:
+            raise ValueError("Shard {0} has other legislators or committees "
+                             "than shard {1}".format(manifest['shard'],
+                                                     first['shard']))
+        check_files(manifest['directory'], manifest['shared'])
+        for congress, files in manifest['congresses'].items():
+            check_files(os.path.join(manifest['directory'], congress), files)
+    return manifests
+
+
+def link_or_copy(src, dest):
+    """
+    Hard link dest to src when they are on the same file system, copy it
+    otherwise.
+    """
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def copy_files(src, dest, names):
+    for name in sorted(names):
+        target = os.path.join(dest, name)
+        parent = os.path.dirname(target)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        link_or_copy(os.path.join(src, name), target)
+
+
+def merge_shards(directories, dest, threads=THREADS):
+    """
+    Assemble the output of a complete set of shards in dest: every
+    congress directory, the shared tables from the first shard and
+    all_votes and all_votes_people consolidated from every congress.
+    Each congress directory replaces any older one in dest as a whole.
+    :return list: the validated manifests
+    """
+    dest = os.path.abspath(dest)
+    if any(os.path.abspath(d) == dest for d in directories):
+        raise ValueError("Merge into a directory that is not a shard")
+    manifests = check_shards(directories)
+    fmt = manifests[0]['options'].get('format', 'csv')
+
+    if not os.path.isdir(dest):
+        os.makedirs(dest)
+
+    for manifest in manifests:
+        for congress, files in sorted(manifest['congresses'].items()):
+            logger.info("Merging Congress %s from shard %s", congress,
+                        manifest['shard'])
+            with replace_dir(os.path.join(dest, congress)) as tmp_dir:
+                copy_files(os.path.join(manifest['directory'], congress),
+                           tmp_dir, files)
+
+    for name in manifests[0]['shared']:
+        target = os.path.join(dest, name)
+        if os.path.exists(target):
+            os.remove(target)
+        link_or_copy(os.path.join(manifests[0]['directory'], name), target)
+
+    consolidate_votes(dest, dest, fmt, threads)
+    return manifests
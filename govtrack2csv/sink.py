@@ -0,0 +1,247 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Write the tables straight into a database instead of one file per table per
+congress. Sinks are named by a string like sqlite:/path/to/govtrack.db so
+they can travel in the congress dicts handed to the pool workers, each
+process opens its own connection the first time it needs one.
+
+The rows of each congress are replaced in a single transaction, so rerunning
+a congress (or an --incremental run) only rewrites that congress.
+"""
+
+import logging
+import os
+import sqlite3
+
+import pandas as pd
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+SINKS = ['sqlite']
+
+# Column added to the per congress tables recording the congress directory
+# the rows came from, the key a rerun replaces rows by.
+CONGRESS_COLUMN = 'source_congress'
+
+# Columns that get an index once the load is done.
+INDEX_COLUMNS = ['bill_id', 'vote_id', 'bioguide_id', 'thomas_id',
+                 'committee_id', CONGRESS_COLUMN]
+
+INSERT_BATCH = 10000
+# Pool workers saving congresses take turns at the write lock, wait for it.
+BUSY_TIMEOUT = 600
+
+_open_sinks = {}
+
+
+def parse_sink(spec):
+    """
+    Split a sink spec like sqlite:path.db into its kind and target.
+    """
+    kind, _, target = spec.partition(':')
+    if kind not in SINKS or not target:
+        raise ValueError("Unknown sink {0}, expected one of {1} as "
+                         "kind:path".format(spec, ', '.join(SINKS)))
+    return kind, target
+
+
+def open_sink(spec):
+    """
+    Returns this process's sink for spec, opening it on first use.
+    """
+    if spec not in _open_sinks:
+        kind, target = parse_sink(spec)
+        _open_sinks[spec] = SqliteSink(target)
+    return _open_sinks[spec]
+
+
+def column_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or \
+            pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def sql_value(value):
+    # Lists (the committees of an event) are stored the way to_csv writes
+    # them, NaN, NaT and the NA of nullable columns become NULL.
+    if value is None or value is pd.NA:
+        return None
+    if isinstance(value, (list, dict)):
+        return str(value)
+    if value is pd.NaT or value != value:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def frame_rows(frame, extra=()):
+    """
+    Yield the rows of frame as tuples of sqlite friendly values, skipping
+    the all empty placeholder rows we write to csv for empty tables.
+    """
+    for row in frame.itertuples(index=False, name=None):
+        values = tuple(sql_value(v) for v in row)
+        if all(v is None for v in values):
+            continue
+        yield values + tuple(extra)
+
+
+def quote(name):
+    return '"{0}"'.format(str(name).replace('"', '""'))
+
+
+def index_name(table, column):
+    return "{0}_{1}".format(table, column)
+
+
+class SqliteSink(object):
+    """
+    Bulk loads DataFrames into a SQLite file with WAL journaling and
+    batched inserts.
+    """
+
+    def __init__(self, path, timeout=BUSY_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.conn = None
+        self.pid = None
+
+    def connect(self):
+        # A connection must not be used across a fork, pool workers that
+        # inherited the parent's sink open their own.
+        if self.conn is None or self.pid != os.getpid():
+            self.pid = os.getpid()
+            # We manage transactions ourselves.
+            self.conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                        isolation_level=None)
+            for pragma in ('journal_mode=WAL',
+                           'synchronous=OFF',
+                           'temp_store=MEMORY',
+                           'cache_size=-262144',
+                           'mmap_size=1073741824',
+                           'busy_timeout={0}'.format(self.timeout * 1000)):
+                self.conn.execute("PRAGMA {0}".format(pragma))
+        return self.conn
+
+    def create_table(self, table, frame, per_congress):
+        columns = ["{0} {1}".format(quote(name), column_type(dtype))
+                   for name, dtype in frame.dtypes.items()]
+        if per_congress:
+            columns.append("{0} TEXT".format(quote(CONGRESS_COLUMN)))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS {0} ({1})".format(
+            quote(table), ', '.join(columns)))
+        if per_congress:
+            # Indexed from the start, not in finish, or replacing each
+            # congress's rows scans everything loaded before it.
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})".format(
+                    quote(index_name(table, CONGRESS_COLUMN)), quote(table),
+                    quote(CONGRESS_COLUMN)))
+
+    def insert(self, table, frame, extra=()):
+        names = [quote(c) for c in frame.columns]
+        if extra:
+            names.append(quote(CONGRESS_COLUMN))
+        sql = "INSERT INTO {0} ({1}) VALUES ({2})".format(
+            quote(table), ', '.join(names), ', '.join('?' * len(names)))
+
+        rows = frame_rows(frame, extra)
+        count = 0
+        while True:
+            batch = [row for _, row in zip(range(INSERT_BATCH), rows)]
+            if not batch:
+                return count
+            self.conn.executemany(sql, batch)
+            count += len(batch)
+
+    def write_congress(self, congress, tables):
+        """
+        Replace the rows of one congress in every table in tables, a dict of
+        table name to DataFrame, in a single transaction.
+        """
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, frame in tables.items():
+                self.create_table(table, frame, True)
+                conn.execute("DELETE FROM {0} WHERE {1} = ?".format(
+                    quote(table), quote(CONGRESS_COLUMN)), (str(congress),))
+                self.insert(table, frame, (str(congress),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info("Loaded Congress %s into %s", congress, self.path)
+
+    def write_frame(self, table, frame):
+        """
+        Replace a whole table, like legislators or committees, with frame.
+        """
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DROP TABLE IF EXISTS {0}".format(quote(table)))
+            self.create_table(table, frame, False)
+            self.insert(table, frame)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def has_congress(self, congress):
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT 1 FROM legislation WHERE {0} = ? "
+                                "LIMIT 1".format(quote(CONGRESS_COLUMN)),
+                                (str(congress),)).fetchone() is not None
+        except sqlite3.OperationalError:
+            return False
+
+    def finish(self):
+        """
+        Index the join columns of every table, now that the rows are in, and
+        fold the WAL back into the database file.
+        """
+        conn = self.connect()
+        tables = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            columns = [r[1] for r in conn.execute(
+                "PRAGMA table_info({0})".format(quote(table)))]
+            for column in INDEX_COLUMNS:
+                if column in columns:
+                    conn.execute(
+                        "CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})".format(
+                            quote(index_name(table, column)),
+                            quote(table), quote(column)))
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info("Indexed %s tables in %s", len(tables), self.path)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
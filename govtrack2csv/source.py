@@ -0,0 +1,355 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Where the govtrack data.json files come from: an extracted snapshot
+directory, or a zip, tar, tar.gz or tar.zst of one, read in place.
+
+Every source lists the documents of a congress as ScanEntry tuples, like
+scan.scan_congress does for a directory. zip and plain tar archives can read
+any member directly, so they work everywhere a directory does, and the
+members of a batch are read in archive order. Compressed tars can only be
+read front to back: listing them takes one pass over the archive, and
+converting them another in which stream_members hands each member's content
+straight to the decoder.
+
+Archives are opened once per process and cached, open them before forking
+the pool and the workers inherit the listing.
+"""
+
+import io
+import os
+import re
+import tarfile
+import zipfile
+
+from govtrack2csv.scan import DOCUMENT, EXCLUDED, KINDS, ScanEntry
+from govtrack2csv.scan import scan_congress, scan_order
+
+
+__author__ = 'vance@hackthefed.org'
+
+# Archive suffix and how it is compressed.
+ARCHIVES = [('.tar.gz', 'gz'), ('.tgz', 'gz'), ('.tar.zst', 'zst'),
+            ('.tar.zstd', 'zst'), ('.tar', ''), ('.zip', 'zip')]
+
+# congress/<congress>/<kind>/.../data.json, under whatever directory the
+# snapshot was packed from.
+MEMBER = re.compile(r'^(?P<root>(?:.*/)?)congress/(?P<congress>[^/]+)/'
+                    r'(?P<kind>{0})/(?P<rest>.*)$'.format('|'.join(KINDS)))
+
+# Files outside the congress tree (congress-legislators) are kept in memory
+# when a compressed archive is listed, up to this size each.
+MAX_FILE = 64 * 1024 * 1024
+
+_archives = {}
+
+
+def archive_type(path):
+    """
+    How the archive at path is compressed, or None if it is not one of the
+    archives we read.
+    """
+    lower = path.lower()
+    for suffix, compression in ARCHIVES:
+        if lower.endswith(suffix) and os.path.isfile(path):
+            return compression
+    return None
+
+
+def import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard is required to read .tar.zst archives: "
+                          "pip3 install zstandard")
+    return zstandard
+
+
+def parse_member(name):
+    """
+    Returns (root, congress, kind) for an archive member that is a document
+    we convert, otherwise None.
+    """
+    match = MEMBER.match(name)
+    if match is None:
+        return None
+    rest = match.group('rest')
+    if not (rest == DOCUMENT or rest.endswith('/' + DOCUMENT)):
+        return None
+    if any(part in EXCLUDED for part in rest.split('/')):
+        return None
+    return match.group('root'), match.group('congress'), match.group('kind')
+
+
+def order_entries(entries, kinds):
+    """
+    A congress's entries grouped by kind in the order of kinds, in the order
+    they are listed within a kind.
+    """
+    return [e for kind in kinds for e in entries if e.kind == kind]
+
+
+class DirectorySource(object):
+    """
+    The congress directory of an extracted snapshot.
+    """
+    random_access = True
+
+    def __init__(self, congress_dir):
+        self.congress_dir = congress_dir
+
+    def congresses(self):
+        return sorted(c for c in os.listdir(self.congress_dir)
+                      if os.path.isdir(os.path.join(self.congress_dir, c)))
+
+    def scan(self, congress, kinds=KINDS, with_stat=False):
+        return scan_congress(os.path.join(self.congress_dir, str(congress)),
+                             kinds, with_stat)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+class ArchiveSource(object):
+    """
+    What zip and tar sources share: a listing of the documents of each
+    congress and of the other files, both built on first use.
+    """
+    random_access = True
+
+    def __init__(self, path):
+        self.path = path
+        self.root = None
+        self.listing = None
+        self.files = None
+
+    def list_members(self):
+        """
+        Yields (name, size, mtime, position) for every regular file.
+        """
+        raise NotImplementedError
+
+    def build_listing(self):
+        self.listing = {}
+        self.files = {}
+        for name, size, mtime, position in self.list_members():
+            parsed = parse_member(name)
+            if parsed is None:
+                self.files[name] = position
+                continue
+            root, congress, kind = parsed
+            if self.root is None:
+                self.root = root
+            self.listing.setdefault(congress, []).append(
+                ScanEntry(kind, name, size, mtime))
+        # In the order a directory scan finds them, not archive order, so a
+        # snapshot converts the same whichever way it is stored.
+        for entries in self.listing.values():
+            entries.sort(key=lambda e: scan_order(e.path))
+
+    def congresses(self):
+        if self.listing is None:
+            self.build_listing()
+        return sorted(self.listing)
+
+    def scan(self, congress, kinds=KINDS, with_stat=False):
+        if self.listing is None:
+            self.build_listing()
+        return order_entries(self.listing.get(str(congress), []), kinds)
+
+    def member_name(self, name):
+        """
+        The member for a path relative to the snapshot, like
+        congress-legislators/legislators-current.csv.
+        """
+        if self.listing is None:
+            self.build_listing()
+        if (self.root or '') + name in self.files:
+            return (self.root or '') + name
+        for member in self.files:
+            if member.endswith('/' + name):
+                return member
+        raise IOError("{0} has no {1}".format(self.path, name))
+
+
+class ZipSource(ArchiveSource):
+    """
+    A zip of a snapshot. Members are read straight out of the zip.
+    """
+
+    def __init__(self, path):
+        ArchiveSource.__init__(self, path)
+        self.zip = None
+        self.pid = None
+
+    def open(self):
+        # Each process needs its own file position.
+        if self.zip is None or self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.zip = zipfile.ZipFile(self.path)
+        return self.zip
+
+    def list_members(self):
+        infos = sorted(self.open().infolist(), key=lambda i: i.header_offset)
+        for info in infos:
+            if not info.is_dir():
+                yield info.filename, info.file_size, None, info.filename
+
+    def read(self, name):
+        return self.open().read(name)
+
+    def read_file(self, name):
+        return self.read(self.member_name(name))
+
+
+class TarSource(ArchiveSource):
+    """
+    A tar of a snapshot. An uncompressed one is read member by member at
+    the offsets its listing recorded. A compressed one can only be streamed,
+    the files outside the congress tree are kept from the listing pass.
+    """
+
+    def __init__(self, path, compression=''):
+        ArchiveSource.__init__(self, path)
+        self.compression = compression
+        self.random_access = not compression
+        self.offsets = {}
+        self.fd = None
+        self.pid = None
+
+    def open_stream(self):
+        """
+        Returns (tarfile, file to close) reading the archive front to back.
+        """
+        if self.compression == 'zst':
+            zstandard = import_zstandard()
+            raw = open(self.path, 'rb')
+            reader = zstandard.ZstdDecompressor().stream_reader(raw)
+            return tarfile.open(fileobj=reader, mode='r|'), raw
+        if self.compression == 'gz':
+            return tarfile.open(self.path, mode='r|gz'), None
+        return tarfile.open(self.path, mode='r:'), None
+
+    def list_members(self):
+        tar, raw = self.open_stream()
+        try:
+            for info in tar:
+                if not info.isfile():
+                    continue
+                position = (info.offset_data, info.size)
+                if self.compression and parse_member(info.name) is None:
+                    # The only chance to keep it.
+                    position = None
+                    if info.size <= MAX_FILE:
+                        position = tar.extractfile(info).read()
+                yield info.name, info.size, int(info.mtime), position
+                if not self.compression:
+                    self.offsets[info.name] = position
+        finally:
+            tar.close()
+            if raw is not None:
+                raw.close()
+
+    def read(self, name):
+        if self.compression:
+            raise IOError("{0} is compressed, its members can only be "
+                          "streamed".format(self.path))
+        if self.listing is None:
+            self.build_listing()
+        if self.fd is None or self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.fd = os.open(self.path, os.O_RDONLY)
+        offset, size = self.offsets[name]
+        return os.pread(self.fd, size, offset)
+
+    def read_file(self, name):
+        member = self.member_name(name)
+        if not self.compression:
+            return self.read(member)
+        content = self.files[member]
+        if content is None:
+            raise IOError("{0} in {1} is too big to keep".format(member,
+                                                                 self.path))
+        return content
+
+    def stream_members(self, congresses=None):
+        """
+        Read the archive once, yielding (congress, kind, name, content) for
+        every document of the given congresses, or of all of them.
+        """
+        tar, raw = self.open_stream()
+        try:
+            for info in tar:
+                if not info.isfile():
+                    continue
+                parsed = parse_member(info.name)
+                if parsed is None:
+                    continue
+                root, congress, kind = parsed
+                if congresses is not None and congress not in congresses:
+                    continue
+                yield congress, kind, info.name, \
+                    tar.extractfile(info).read()
+        finally:
+            tar.close()
+            if raw is not None:
+                raw.close()
+
+
+def open_archive(path):
+    """
+    Returns this process's source for the archive at path, opening it on
+    first use.
+    """
+    if path not in _archives:
+        compression = archive_type(path)
+        if compression is None:
+            raise ValueError("{0} is not a zip, tar, tar.gz or tar.zst "
+                             "archive".format(path))
+        if compression == 'zip':
+            _archives[path] = ZipSource(path)
+        else:
+            _archives[path] = TarSource(path, compression)
+    return _archives[path]
+
+
+def congress_source(congress):
+    """
+    The source of a congress dict, its archive if it has one, otherwise the
+    directory in its src.
+    """
+    if congress.get('archive'):
+        return open_archive(congress['archive'])
+    return DirectorySource(congress['src'])
+
+
+def read_file(src, name):
+    """
+    Returns the content of a file of the snapshot at src, a directory or an
+    archive, given its path relative to the snapshot.
+    """
+    if archive_type(src) is not None:
+        return open_archive(src).read_file(name)
+    with open(os.path.join(src, name), 'rb') as f:
+        return f.read()
+
+
+def open_file(src, name):
+    """
+    read_file as a file object, for pd.read_csv and the like.
+    """
+    return io.BytesIO(read_file(src, name))
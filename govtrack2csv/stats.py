@@ -0,0 +1,210 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Per stage timing for convert_congress. Each process collects wall time, CPU
+time, call, file and row counts per stage for the congress it is working on
+and hands them back as a plain dict, which the parent merges into one report.
+
+When nothing is being collected stage() returns a shared do nothing context
+manager, so the instrumented code costs next to nothing.
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+
+from contextlib import nullcontext
+
+
+__author__ = 'vance@hackthefed.org'
+
+# The order stages show up in the summary.
+STAGES = ['legislators', 'committees', 'walk', 'read', 'decode', 'extract',
+          'dataframe', 'normalize', 'write']
+
+NULL_STAGE = nullcontext()
+
+_current = None
+
+
+def peak_rss_kb():
+    """
+    Returns the peak resident set size of this process in kilobytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def new_record():
+    return {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'files': 0, 'rows': 0}
+
+
+class StageTimer(object):
+    """
+    Adds the wall and CPU time spent inside a with block to a stage record.
+    """
+
+    __slots__ = ['record', 'wall', 'cpu']
+
+    def __init__(self, record):
+        self.record = record
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        record = self.record
+        record['wall'] += time.perf_counter() - self.wall
+        record['cpu'] += time.process_time() - self.cpu
+        record['calls'] += 1
+
+
+class Stats(object):
+    """
+    Stage records for one congress, or one batch of a congress.
+    """
+
+    def __init__(self, congress):
+        self.congress = congress
+        self.stages = {}
+        self.peak_rss_kb = 0
+
+    def record(self, name):
+        if name not in self.stages:
+            self.stages[name] = new_record()
+        return self.stages[name]
+
+    def stage(self, name):
+        return StageTimer(self.record(name))
+
+    def count(self, name, files=0, rows=0):
+        record = self.record(name)
+        record['files'] += files
+        record['rows'] += rows
+
+    def as_dict(self):
+        self.peak_rss_kb = max(self.peak_rss_kb, peak_rss_kb())
+        return {'congress': self.congress,
+                'pid': os.getpid(),
+                'peak_rss_kb': self.peak_rss_kb,
+                'stages': self.stages}
+
+
+def start(congress):
+    """
+    Start collecting stats for congress in this process.
+    """
+    global _current
+    _current = Stats(congress)
+    return _current
+
+
+def stop():
+    """
+    Stop collecting and return what was collected as a dict, or None if
+    nothing was being collected.
+    """
+    global _current
+    collected, _current = _current, None
+    return collected.as_dict() if collected else None
+
+
+def stage(name):
+    """
+    Context manager timing a stage of the current congress.
+    """
+    return _current.stage(name) if _current is not None else NULL_STAGE
+
+
+def count(name, files=0, rows=0):
+    if _current is not None:
+        _current.count(name, files, rows)
+
+
+def merge_stages(into, stages):
+    for name, record in stages.items():
+        total = into.setdefault(name, new_record())
+        for key, value in record.items():
+            total[key] += value
+
+
+def build_report(collected, wall):
+    """
+    Merge the dicts returned by stop(), possibly several per congress from
+    different processes, into a report with per congress and overall stage
+    totals.
+    """
+    congresses = {}
+    totals = {}
+    peak = 0
+
+    for item in collected:
+        if not item:
+            continue
+        congress = congresses.setdefault(str(item['congress']), {
+            'stages': {}, 'peak_rss_kb': 0, 'pids': []})
+        merge_stages(congress['stages'], item['stages'])
+        merge_stages(totals, item['stages'])
+        congress['peak_rss_kb'] = max(congress['peak_rss_kb'],
+                                      item['peak_rss_kb'])
+        if item['pid'] not in congress['pids']:
+            congress['pids'].append(item['pid'])
+        peak = max(peak, item['peak_rss_kb'])
+
+    return {'wall': wall,
+            'peak_rss_kb': peak,
+            'totals': totals,
+            'congresses': congresses}
+
+
+def write_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def stage_order(stages):
+    known = [s for s in STAGES if s in stages]
+    return known + sorted(s for s in stages if s not in STAGES)
+
+
+def summary(report):
+    """
+    Returns a human readable summary of a report.
+    """
+    lines = ["Finished in {0:.1f}s, peak RSS of any process {1:.0f} MB".format(
+        report['wall'], report['peak_rss_kb'] / 1024.0)]
+    lines.append("{0:<12} {1:>10} {2:>10} {3:>9} {4:>12}".format(
+        'stage', 'wall s', 'cpu s', 'files', 'rows'))
+    for name in stage_order(report['totals']):
+        r = report['totals'][name]
+        lines.append("{0:<12} {1:>10.2f} {2:>10.2f} {3:>9} {4:>12}".format(
+            name, r['wall'], r['cpu'], r['files'], r['rows']))
+
+    def congress_wall(item):
+        return sum(r['wall'] for r in item[1]['stages'].values())
+
+    lines.append("Slowest congresses:")
+    ranked = sorted(report['congresses'].items(), key=congress_wall,
+                    reverse=True)
+    for name, congress in ranked[:5]:
+        lines.append("  {0:<10} {1:>8.2f}s {2:>8.0f} MB".format(
+            name, congress_wall((name, congress)),
+            congress['peak_rss_kb'] / 1024.0))
+    return "\n".join(lines)
@@ -0,0 +1,130 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Incremental csv writers for the streaming mode of convert_congress. Rows are
+written as they are extracted instead of being collected into DataFrames, so
+memory use does not grow with the size of the congress.
+"""
+
+import csv
+import logging
+import os
+
+from govtrack2csv.util import datestring_to_datetime
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+BUFFER_ROWS = 1000
+
+
+MIDNIGHT = ' 00:00:00'
+
+
+class TableWriter(object):
+    """
+    Writes rows to a csv file laid out the way DataFrame.to_csv lays out our
+    tables: an unnamed index column followed by the table columns. Rows are
+    held in a buffer of at most buffer_rows before they are written out.
+
+    The dates columns are parsed a value at a time and written the way
+    to_csv writes a datetime64 column, 2013-01-03 10:02:00, or 2013-01-03
+    when no value of the column has a time of day. That is only known once
+    every row is in, close rewrites the file if a column turns out to hold
+    dates only.
+    """
+
+    def __init__(self, path, columns, buffer_rows=BUFFER_ROWS, dates=()):
+        self.path = path
+        self.columns = columns
+        self.buffer_rows = buffer_rows
+        self.buffer = []
+        self.count = 0
+        # Positions in a written row, after the index, of the date columns
+        # and of those with a time of day seen so far.
+        self.dates = [i + 1 for i, name in enumerate(columns)
+                      if name in dates]
+        self.timed = set()
+        self.f = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.f, lineterminator='\n')
+        self.writer.writerow([''] + list(columns))
+
+    def format_date(self, i, value):
+        try:
+            parsed = datestring_to_datetime(value)
+        except (TypeError, ValueError):
+            logger.warning("%s: %s is not a date, written as is", self.path,
+                           value)
+            return value
+        if parsed is None:
+            return None
+        formatted = parsed.isoformat(' ')
+        if not formatted.endswith(MIDNIGHT):
+            self.timed.add(i)
+        return formatted
+
+    def writerow(self, row):
+        row = [self.count] + list(row)
+        for i in self.dates:
+            if row[i]:
+                row[i] = self.format_date(i, row[i])
+        self.buffer.append(row)
+        self.count += 1
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            if row:
+                self.writerow(row)
+
+    def flush(self):
+        self.writer.writerows(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        """
+        Flush what is left and close the file. Like the DataFrames built by
+        convert_congress, an empty table gets a single row of blanks.
+        """
+        if not self.count:
+            self.writerow([None] * len(self.columns))
+        self.flush()
+        self.f.close()
+
+        untimed = [i for i in self.dates if i not in self.timed]
+        if untimed:
+            self.strip_times(untimed)
+
+    def strip_times(self, positions):
+        """
+        Rewrite the file with the midnight times of the columns at positions
+        dropped, one row at a time.
+        """
+        tmp_path = "{0}.tmp".format(self.path)
+        with open(self.path, 'r', encoding='utf-8', newline='') as src, \
+                open(tmp_path, 'w', encoding='utf-8', newline='') as dest:
+            reader = csv.reader(src)
+            writer = csv.writer(dest, lineterminator='\n')
+            writer.writerow(next(reader))
+            for row in reader:
+                for i in positions:
+                    if row[i].endswith(MIDNIGHT):
+                        row[i] = row[i][:-len(MIDNIGHT)]
+                writer.writerow(row)
+        os.replace(tmp_path, self.path)
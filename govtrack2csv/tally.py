@@ -0,0 +1,154 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Column oriented collection of roll call tallies. There is one tally per
+member per roll call, millions of them for the full data set, so instead of a
+python list per tally we keep one array per votes_people column.
+"""
+
+import logging
+import sys
+
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from govtrack2csv.schema import COLUMNS
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+# vote column categories, TALLY_CODES maps each govtrack tally key to one.
+VOTE_CODES = ['y', 'n', 'nv', 'p']
+TALLY_CODES = {
+    'Yea': 0,
+    'Aye': 0,
+    'Nay': 1,
+    'No': 1,
+    'Not Voting': 2,
+    'Present': 3
+}
+
+
+def intern_string(value):
+    """
+    sys.intern for strings, anything else, a null party say, as it is.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class TallyColumns(object):
+    """
+    The votes_people table as columns. Vote codes are an int8 array, the
+    string columns hold interned strings so every repeat of a vote_id, party
+    or state is the same object.
+    """
+
+    __slots__ = ['vote', 'vote_id', 'bioguide_id', 'party', 'state', 'date']
+
+    def __init__(self):
+        self.vote = array('b')
+        self.vote_id = []
+        self.bioguide_id = []
+        self.party = []
+        self.state = []
+        self.date = []
+
+    def __len__(self):
+        return len(self.vote)
+
+    def __getitem__(self, index):
+        """
+        A slice of the tallies as a new TallyColumns.
+        """
+        if not isinstance(index, slice):
+            raise TypeError("TallyColumns only take slices")
+        part = TallyColumns()
+        for name in self.__slots__:
+            getattr(part, name).extend(getattr(self, name)[index])
+        return part
+
+    def add_vote(self, v):
+        """
+        Append every member tally of a roll call. String tallies (the vice
+        president) are ignored as are tallies under keys we do not know.
+        """
+        intern = sys.intern
+        vote_id = intern_string(v['vote_id'])
+        date = intern_string(v['date'])
+
+        for k, tallies in v['votes'].items():
+            code = TALLY_CODES.get(k)
+            if code is None:
+                logger.error("bad vote key: %s", k)
+                continue
+
+            people = [t for t in tallies if not isinstance(t, str)]
+            try:
+                ids = [intern(t['id']) for t in people]
+                parties = [intern(t['party']) for t in people]
+                states = [intern(t['state']) for t in people]
+            except (KeyError, TypeError):
+                ids, parties, states = self._complete_tallies(people)
+
+            n = len(ids)
+            self.vote.extend([code] * n)
+            self.vote_id.extend([vote_id] * n)
+            self.date.extend([date] * n)
+            self.bioguide_id.extend(ids)
+            self.party.extend(parties)
+            self.state.extend(states)
+
+    @staticmethod
+    def _complete_tallies(people):
+        # Slow path, only taken when a tally is missing a key or has a value
+        # that is not a string. Drop the tallies missing a key and keep the
+        # other values as they are, like the row by row code does.
+        ids, parties, states = [], [], []
+        for t in people:
+            try:
+                row = (intern_string(t['id']), intern_string(t['party']),
+                       intern_string(t['state']))
+            except KeyError as ke:
+                logger.error("bad vote key: %s", ke)
+                continue
+            ids.append(row[0])
+            parties.append(row[1])
+            states.append(row[2])
+        return ids, parties, states
+
+    def extend(self, other):
+        for name in self.__slots__:
+            getattr(self, name).extend(getattr(other, name))
+
+    def to_frame(self):
+        """
+        Returns votes_people as a DataFrame with a categorical vote column.
+        """
+        # Copy so the array can keep growing after the frame is built.
+        codes = np.frombuffer(self.vote, dtype=np.int8).copy() if len(self) \
+            else np.array([], dtype=np.int8)
+        return pd.DataFrame({
+            'vote': pd.Categorical.from_codes(codes, VOTE_CODES),
+            'vote_id': self.vote_id,
+            'bioguide_id': self.bioguide_id,
+            'party': self.party,
+            'state': self.state,
+            'date': self.date,
+        }, columns=COLUMNS['votes_people'])
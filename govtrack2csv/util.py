@@ -15,10 +15,28 @@
 
 from datetime import datetime
 
+import pandas as pd
+
 
 def datestring_to_datetime(string):
-    d_array = [int(x) for x in "2011-02-03".split("-")].extend([0, 0])
-    if d_array:
-        return datetime(*d_array)
-    else:
+    """
+    Parse a govtrack date or date and time, 2013-01-03 or
+    2013-01-03T10:02:00-05:00, into a naive datetime. The UTC offset is
+    dropped, govtrack times are all Eastern, so the datetime keeps the wall
+    clock time the event was recorded at. Returns None for an empty value.
+    """
+    if not string:
         return None
+    return datetime.fromisoformat(string[:19])
+
+
+def datestrings_to_datetimes(values):
+    """
+    datestring_to_datetime for a whole Series at once, returns a
+    datetime64[s] Series. Values that don't parse become NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    trimmed = values.astype(object).str.slice(0, 19)
+    return pd.to_datetime(trimmed, format='ISO8601',
+                          errors='coerce').astype('datetime64[s]')
@@ -0,0 +1,312 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Notice data.json files changing under the congress directory of a snapshot,
+as rsync delivers them, and report which congresses changed.
+
+Two watchers, both plain Linux. InotifyWatcher asks the kernel, through
+libc with ctypes, to tell us about every data.json written, renamed into
+place or removed under congress/<N>/{bills,amendments,votes}. PollWatcher
+rescans those trees every interval and compares sizes and mtimes, it works
+anywhere but costs a stat per document per scan.
+
+rsync delivers a burst of files at a time, debounced waits for a burst to
+go quiet, or for max_delay at the most, before handing over the congresses
+it touched, so each is converted once per burst.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+from govtrack2csv.scan import DOCUMENT, EXCLUDED, KINDS, scan_congress
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ['auto', 'inotify', 'poll']
+
+# Seconds a burst of changes has to be quiet for, and the longest we wait
+# for one to end while changes keep coming.
+DEBOUNCE = 2.0
+MAX_DELAY = 30.0
+POLL_INTERVAL = 5.0
+
+# From <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+    IN_DELETE | IN_DELETE_SELF
+EVENT = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+def list_congresses(congress_dir):
+    try:
+        return sorted(c for c in os.listdir(congress_dir)
+                      if os.path.isdir(os.path.join(congress_dir, c)))
+    except FileNotFoundError:
+        return []
+
+
+class PollWatcher(object):
+    """
+    Finds changes by scanning every congress each interval seconds.
+    """
+
+    def __init__(self, congress_dir, interval=POLL_INTERVAL):
+        self.congress_dir = congress_dir
+        self.interval = interval
+        self.state = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def scan(self):
+        state = {}
+        for congress in list_congresses(self.congress_dir):
+            entries = scan_congress(os.path.join(self.congress_dir, congress),
+                                    KINDS, with_stat=True)
+            state[congress] = dict((e.path, (e.size, e.mtime))
+                                   for e in entries)
+        return state
+
+    def wait(self, timeout=None):
+        """
+        Returns the congresses that changed, once the next scan is due or
+        after timeout seconds, an empty set if that came first.
+        """
+        now = time.monotonic()
+        delay = self.next_scan - now
+        if timeout is not None and timeout < delay:
+            time.sleep(max(timeout, 0))
+            return set()
+        time.sleep(max(delay, 0))
+
+        state = self.scan()
+        self.next_scan = time.monotonic() + self.interval
+        changed = set(c for c in set(state) | set(self.state)
+                      if state.get(c) != self.state.get(c))
+        self.state = state
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Finds changes from inotify events, one watch per directory of the
+    congress trees. Directories that appear later, a new bill or a new
+    congress, are watched as they are created.
+    """
+
+    def __init__(self, congress_dir):
+        self.congress_dir = os.path.abspath(congress_dir)
+        self.libc = load_libc()
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise_errno("inotify_init1")
+        self.paths = {}
+        try:
+            self.add_tree(self.congress_dir)
+        except BaseException:
+            self.close()
+            raise
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path),
+                                         WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() == errno.ENOSPC:
+                raise OSError(errno.ENOSPC, "Out of inotify watches, raise "
+                              "fs.inotify.max_user_watches or poll instead")
+            raise_errno("inotify_add_watch {0}".format(path))
+        self.paths[wd] = path
+
+    def watched(self, path):
+        """
+        Whether a directory is part of what we watch, the congress dir,
+        a congress, or inside its bills, amendments or votes.
+        """
+        parts = os.path.relpath(path, self.congress_dir).split(os.sep)
+        if parts == ['.']:
+            return True
+        if len(parts) > 1 and parts[1] not in KINDS:
+            return False
+        return not any(part in EXCLUDED or part.startswith('.')
+                       for part in parts)
+
+    def add_tree(self, top):
+        """
+        Watch top and every directory under it we care about.
+        """
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            if not self.watched(directory):
+                continue
+            try:
+                self.add_watch(directory)
+                with os.scandir(directory) as it:
+                    stack.extend(e.path for e in it
+                                 if e.is_dir(follow_symlinks=False))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def congress_of(self, path):
+        relative = os.path.relpath(path, self.congress_dir)
+        if relative == '.':
+            return None
+        return relative.split(os.sep)[0]
+
+    def read_events(self):
+        """
+        Yields (path, mask) for every event queued.
+        """
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                directory = self.paths.get(wd)
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                if directory is None and not mask & IN_Q_OVERFLOW:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name)) if name \
+                    else directory
+                yield path, mask
+
+    def wait(self, timeout=None):
+        """
+        Returns the congresses that changed as soon as any did, or an empty
+        set after timeout seconds.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        for path, mask in self.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # We lost events, take it that everything changed.
+                logger.warning("inotify queue overflowed, checking every "
+                               "congress")
+                changed.update(list_congresses(self.congress_dir))
+                continue
+            congress = self.congress_of(path)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have landed before the watch did.
+                    self.add_tree(path)
+                    changed.add(congress)
+                elif mask & (IN_DELETE | IN_MOVED_FROM) and congress:
+                    changed.add(congress)
+            elif os.path.basename(path) == DOCUMENT and \
+                    mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE |
+                            IN_MOVED_FROM):
+                changed.add(congress)
+        changed.discard(None)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                       use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError(errno.ENOSYS, "This libc has no inotify")
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                       ctypes.c_uint32]
+    return libc
+
+
+def raise_errno(what):
+    code = ctypes.get_errno()
+    raise OSError(code, "{0}: {1}".format(what, os.strerror(code)))
+
+
+def open_watcher(congress_dir, backend='auto', interval=POLL_INTERVAL):
+    """
+    Returns a watcher for congress_dir. auto uses inotify and falls back to
+    polling if it is not available.
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown watch backend: {0}".format(backend))
+    if backend in ('auto', 'inotify'):
+        try:
+            return InotifyWatcher(congress_dir)
+        except OSError as e:
+            if backend == 'inotify':
+                raise
+            logger.warning("Can't use inotify (%s), polling every %ss", e,
+                           interval)
+    return PollWatcher(congress_dir, interval)
+
+
+def debounced(watcher, debounce=DEBOUNCE, max_delay=MAX_DELAY):
+    """
+    Yields the set of congresses changed in each burst of changes, once
+    nothing changed for debounce seconds or max_delay after the burst
+    started.
+    """
+    pending = set()
+    started = last = None
+    while True:
+        timeout = None
+        if pending:
+            now = time.monotonic()
+            timeout = max(0, min(last + debounce, started + max_delay) - now)
+        changed = watcher.wait(timeout)
+
+        now = time.monotonic()
+        if changed:
+            if not pending:
+                started = now
+            pending.update(changed)
+            last = now
+        if pending and (now - last >= debounce or
+                        now - started >= max_delay):
+            yield pending
+            pending = set()
@@ -0,0 +1,93 @@
+# This file is part of govtrack2csv.
+#
+# govtrack2csv is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with govtrack2csv.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+Loading the congress-legislators yaml files. They are parsed with libyaml
+when PyYAML was built with it, and the parsed result is pickled in a cache
+keyed by the hash of the file's content, so as long as a file doesn't change
+it is only ever parsed once.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+__author__ = 'vance@hackthefed.org'
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached structures change shape.
+CACHE_VERSION = 1
+
+
+def cache_dir():
+    """
+    Where parsed yaml files are cached, $GOVTRACK2CSV_CACHE or
+    ~/.cache/govtrack2csv.
+    """
+    if os.environ.get('GOVTRACK2CSV_CACHE'):
+        return os.environ['GOVTRACK2CSV_CACHE']
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'govtrack2csv')
+
+
+def cache_path(content, directory):
+    digest = hashlib.sha1(content).hexdigest()
+    return os.path.join(directory, "{0}-v{1}.pickle".format(digest,
+                                                            CACHE_VERSION))
+
+
+def load_yaml(path, directory=None, content=None):
+    """
+    Returns the parsed content of a yaml file, from the cache if the same
+    content was parsed before. Every call returns a fresh copy, callers are
+    free to modify it. Given its content, path is only used in messages.
+    """
+    if content is None:
+        with open(path, 'rb') as f:
+            content = f.read()
+
+    directory = directory or cache_dir()
+    cached = cache_path(content, directory)
+    try:
+        with open(cached, 'rb') as f:
+            return pickle.load(f)
+    except (IOError, OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    logger.info("Parsing %s with %s", path, SafeLoader.__name__)
+    data = yaml.load(content, Loader=SafeLoader)
+
+    # A cache we can't write only costs us the next parse.
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = "{0}.{1}.tmp".format(cached, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cached)
+    except (IOError, OSError) as e:
+        logger.warning("Could not cache %s: %s", path, e)
+
+    return data
@@ -9,9 +9,17 @@ setup(name='govtrack2csv',
       author_email='vance@hackthefed.org',
       license='GPL',
       packages=['govtrack2csv'],
-      scripts=['bin/convert_congress', 'bin/extract_votes'],
+      scripts=['bin/convert_congress', 'bin/extract_votes',
+               'bin/merge_shards'],
+      python_requires='>=3.9',
       install_requires=[
-          'pandas',
-          'pyyaml'
+          'numpy',
+          'pandas>=2.0',
+          'pyyaml>=5.4'
       ],
+      extras_require={
+          'fast': ['orjson'],
+          'columnar': ['pyarrow'],
+          'zstd': ['zstandard'],
+      },
       zip_safe=False)